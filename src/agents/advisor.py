@@ -3,15 +3,220 @@ Advisor Agent - Agent tư vấn tổng hợp
 Nhiệm vụ: Tổng hợp thông tin từ tất cả agents, đưa ra tư vấn toàn diện và kế hoạch hành động
 """
 import asyncio
-import json
-from typing import Dict, List, Any, Optional
+import heapq
+from typing import Dict, List, Any, Optional, Callable, Awaitable, Tuple
+from functools import lru_cache
 from loguru import logger
-from datetime import datetime, timedelta
+import re
+from datetime import date, datetime
+from dateutil import parser as date_parser
+from dateutil.relativedelta import relativedelta
 
-from ..utils.llm_client import llm_manager
+from ..utils.llm_client import llm_manager, bind_stream_section
 from ..config.prompts import ADVISOR_PROMPT, VIETNAMESE_STUDENT_CONTEXT
 from ..tools.email_sender import email_sender
 from ..tools.web_search import web_search_tool
+from ..utils.session_manager import session_manager
+from ..utils.json_utils import dumps_json
+
+EXECUTIVE_SUMMARY_SCHEMA = {
+    "key_findings": [
+        {
+            "category": "string (academic/financial/opportunities/challenges)",
+            "finding": "string",
+            "impact": "string (high/medium/low)"
+        }
+    ],
+    "overall_assessment": "string",
+    "top_opportunities": ["list of top 3 opportunities"],
+    "main_challenges": ["list of main challenges"],
+    "recommended_focus": "string",
+    "success_outlook": "string (very_positive/positive/moderate/challenging)"
+}
+
+IMPROVEMENT_PLAN_SCHEMA = {
+    "immediate_actions": [
+        {
+            "action": "string",
+            "timeline": "string",
+            "priority": "string (high/medium/low)",
+            "cost": "string",
+            "expected_impact": "string"
+        }
+    ],
+    "short_term_goals": [
+        {
+            "goal": "string",
+            "timeline": "string",
+            "steps": ["list of steps"],
+            "resources_needed": ["list"],
+            "success_metrics": "string"
+        }
+    ],
+    "long_term_objectives": [
+        {
+            "objective": "string",
+            "timeline": "string",
+            "preparation": ["list"],
+            "milestones": ["list"]
+        }
+    ],
+    "monthly_checklist": {
+        "month_1": ["list of tasks"],
+        "month_2": ["list of tasks"],
+        "month_3": ["list of tasks"],
+        "month_6": ["list of tasks"]
+    }
+}
+
+VISA_SCHEMA = {
+    "visa_type": "string",
+    "requirements": ["list of requirements"],
+    "documents_needed": ["list of documents"],
+    "processing_time": "string",
+    "fees": "string",
+    "important_notes": ["list of notes"]
+}
+
+# System prompts are built once at import so every call reuses the same string
+# (this also keeps the prefix stable for provider-side prompt caching)
+EXECUTIVE_SUMMARY_SYSTEM_PROMPT = f"""
+{ADVISOR_PROMPT}
+
+Tạo tóm tắt tổng quan ngắn gọn và súc tích cho phiên tư vấn học bổng.
+Tập trung vào những điểm quan trọng nhất và kết luận chính.
+"""
+
+IMPROVEMENT_PLAN_SYSTEM_PROMPT = """
+Tạo kế hoạch cải thiện hồ sơ cụ thể và có thể thực hiện.
+Ưu tiên các hành động có impact cao và phù hợp với sinh viên Việt Nam.
+"""
+
+VISA_SYSTEM_PROMPT = """
+Trích xuất thông tin visa du học cho sinh viên Việt Nam.
+Tập trung vào yêu cầu, thủ tục, và timeline.
+"""
+
+COMBINED_SYSTEM_PROMPT = f"""
+{ADVISOR_PROMPT}
+
+Tạo đồng thời các phần sau cho phiên tư vấn học bổng:
+- executive_summary: tóm tắt tổng quan ngắn gọn, tập trung vào điểm quan trọng nhất và kết luận chính.
+- improvement_plan: kế hoạch cải thiện hồ sơ cụ thể, ưu tiên hành động có impact cao và phù hợp với sinh viên Việt Nam.
+"""
+
+COMBINED_WITH_VISA_SYSTEM_PROMPT = COMBINED_SYSTEM_PROMPT + \
+    "- visa: thông tin visa du học cho sinh viên Việt Nam (yêu cầu, thủ tục, timeline).\n"
+
+# Module-level so the structured prompt cache (keyed by schema identity) hits
+COMBINED_ANALYSIS_SCHEMA = {
+    "executive_summary": EXECUTIVE_SUMMARY_SCHEMA,
+    "improvement_plan": IMPROVEMENT_PLAN_SCHEMA
+}
+COMBINED_WITH_VISA_SCHEMA = {**COMBINED_ANALYSIS_SCHEMA, "visa": VISA_SCHEMA}
+
+MIN_PRIORITY_MATCH_SCORE = 30
+EARLY_DEADLINE_MONTHS = ("january", "february", "march")
+FULL_VALUE_TOKENS = ("full", "100%")
+PARTIAL_VALUE_TOKENS = ("50%", "partial")
+VIETNAM_KEYWORDS = ("vietnam", "vietnamese")
+YEAR_PATTERN = re.compile(r"\b(19|20)\d{2}\b")
+
+def calculate_success_probability(
+    profile_score: float,
+    high_priority_count: int,
+    immediate_action_count: int
+) -> Tuple[float, float, float, float]:
+    """
+    Tính xác suất thành công (thuần số học, dùng được cho tính lại hàng loạt)
+    
+    Returns:
+        (success_probability, base_probability, scholarship_boost, improvement_boost)
+    """
+    
+    # Base success probability from profile strength
+    if profile_score >= 80:
+        base_probability = 0.8
+    elif profile_score >= 65:
+        base_probability = 0.6
+    elif profile_score >= 50:
+        base_probability = 0.4
+    else:
+        base_probability = 0.2
+    
+    # Adjust for scholarship fit
+    if high_priority_count >= 3:
+        scholarship_boost = 0.15
+    elif high_priority_count >= 1:
+        scholarship_boost = 0.1
+    else:
+        scholarship_boost = 0
+    
+    # Improvement plan impact
+    improvement_boost = min(immediate_action_count * 0.05, 0.2)
+    
+    success_probability = min(base_probability + scholarship_boost + improvement_boost, 0.95)
+    
+    return success_probability, base_probability, scholarship_boost, improvement_boost
+
+def _matches_schema(section: Any, schema: Dict[str, Any]) -> bool:
+    """Check that a parsed section is a dict containing most schema keys"""
+    if not isinstance(section, dict) or not section:
+        return False
+    return len(schema.keys() & section.keys()) >= len(schema) * 0.5
+
+@lru_cache(maxsize=512)
+def _build_recommendation_reason(
+    name: str,
+    value: str,
+    priority: str,
+    competitive_profile: bool
+) -> str:
+    """Tạo lý do đề xuất học bổng từ các trường đã lowercase"""
+    
+    reasons = []
+    
+    if priority == "high":
+        reasons.append("Độ phù hợp cao với hồ sơ của bạn")
+    
+    if "full" in value:
+        reasons.append("Học bổng toàn phần, tiết kiệm tối đa chi phí")
+    elif "50%" in value:
+        reasons.append("Giá trị học bổng cao")
+    
+    if competitive_profile:
+        reasons.append("Hồ sơ của bạn có thể cạnh tranh tốt")
+    
+    if any(keyword in name for keyword in VIETNAM_KEYWORDS):
+        reasons.append("Dành riêng cho sinh viên Việt Nam")
+    
+    return "; ".join(reasons) if reasons else "Phù hợp với ngành học và quốc gia mục tiêu"
+
+@lru_cache(maxsize=256)
+def _parse_deadline(deadline_text: str, today: date) -> Optional[datetime]:
+    """Parse a free-text deadline ("March 15", "15/01/2025", ...) into a date"""
+    
+    default = datetime(today.year, today.month, 1)
+    try:
+        parsed = date_parser.parse(deadline_text, fuzzy=True, default=default)
+    except (ValueError, OverflowError, date_parser.ParserError):
+        return None
+    
+    # Deadlines without an explicit year refer to the next occurrence
+    if not YEAR_PATTERN.search(deadline_text) and parsed.date() < today:
+        try:
+            parsed = parsed.replace(year=parsed.year + 1)
+        except ValueError:  # 29 February
+            parsed = parsed.replace(year=parsed.year + 1, day=28)
+    
+    return parsed
+
+def _deadline_passed(deadline_text: str, today: date) -> bool:
+    """True only when the deadline parses to a date before today"""
+    if not deadline_text:
+        return False
+    deadline_date = _parse_deadline(deadline_text, today)
+    return deadline_date is not None and deadline_date.date() < today
 
 class AdvisorAgent:
     """Agent tư vấn tổng hợp - chuyên gia tư vấn du học"""
@@ -21,6 +226,9 @@ class AdvisorAgent:
         self.llm = llm_manager
         self.email_tool = email_sender
         self.search_tool = web_search_tool
+        self.cache = session_manager  # Redis-backed when USE_REDIS, local otherwise
+        self.visa_cache_ttl = 7 * 24 * 3600  # visa rules change rarely
+        self.visa_search_cache_ttl = 24 * 3600
         
     async def generate_comprehensive_advice(
         self,
@@ -28,7 +236,8 @@ class AdvisorAgent:
         scholarship_analysis: Dict[str, Any],
         profile_analysis: Dict[str, Any],
         financial_analysis: Dict[str, Any],
-        user_email: Optional[str] = None
+        user_email: Optional[str] = None,
+        stream_callback: Optional[Callable[[str, str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """
         Tạo tư vấn tổng hợp từ tất cả thông tin
@@ -39,43 +248,93 @@ class AdvisorAgent:
             profile_analysis: Kết quả phân tích hồ sơ
             financial_analysis: Kết quả phân tích tài chính
             user_email: Email để gửi tư vấn
+            stream_callback: Callback async (section, token) nhận token LLM khi đang stream
             
         Returns:
             Tư vấn tổng hợp và kế hoạch hành động
         """
         logger.info("Generating comprehensive scholarship advice")
         
-        try:
-            # Generate executive summary
-            executive_summary = await self._create_executive_summary(
-                student_info, scholarship_analysis, profile_analysis, financial_analysis
+        if not scholarship_analysis.get("scholarships"):
+            return await self._create_no_scholarship_advice(
+                student_info, profile_analysis, user_email, stream_callback
             )
+        
+        try:
+            country = student_info.get("target_country", "")
+            student_info_json = dumps_json(student_info)  # shared by every prompt below
             
-            # Prioritize scholarship recommendations
-            prioritized_scholarships = await self._prioritize_scholarship_recommendations(
-                scholarship_analysis, profile_analysis, financial_analysis
-            )
+            # Visa cache lookup / web search runs while scholarships are prioritized
+            visa_task = asyncio.create_task(self._prepare_visa_context(country))
+            try:
+                # Prioritize scholarship recommendations (local scoring, no LLM)
+                prioritized_scholarships = await self._prioritize_scholarship_recommendations(
+                    scholarship_analysis, profile_analysis, financial_analysis
+                )
+                
+                visa_info, visa_content = await visa_task
+            finally:
+                # No-op once awaited; stops the lookup if prioritization failed
+                visa_task.cancel()
             
-            # Create detailed improvement plan
-            improvement_plan = await self._create_improvement_plan(
-                profile_analysis, prioritized_scholarships
+            # One LLM round-trip for executive summary, improvement plan and visa
+            combined = await self._create_combined_analysis(
+                student_info, scholarship_analysis, profile_analysis, financial_analysis,
+                prioritized_scholarships, country, visa_content,
+                student_info_json=student_info_json,
+                on_token=bind_stream_section(stream_callback, "advice")
             )
+            executive_summary = combined.get("executive_summary")
+            improvement_plan = combined.get("improvement_plan")
+            
+            if visa_content is not None:
+                visa_info = combined.get("visa")
+                if _matches_schema(visa_info, VISA_SCHEMA) and visa_content:
+                    await self.cache.set_cached(
+                        self._visa_cache_key(country), visa_info, self.visa_cache_ttl
+                    )
+            
+            # Retry, concurrently, only the sections that failed schema validation
+            retries = {}
+            if not _matches_schema(executive_summary, EXECUTIVE_SUMMARY_SCHEMA):
+                retries["executive_summary"] = self._create_executive_summary(
+                    student_info, scholarship_analysis, profile_analysis, financial_analysis,
+                    student_info_json=student_info_json,
+                    on_token=bind_stream_section(stream_callback, "executive_summary")
+                )
+            if not _matches_schema(improvement_plan, IMPROVEMENT_PLAN_SCHEMA):
+                retries["improvement_plan"] = self._create_improvement_plan(
+                    profile_analysis, prioritized_scholarships,
+                    on_token=bind_stream_section(stream_callback, "improvement_plan")
+                )
+            if visa_content is not None and not _matches_schema(visa_info, VISA_SCHEMA):
+                retries["visa"] = self._extract_visa_requirements(country, visa_content)
+            
+            if retries:
+                logger.info("Retrying advice sections separately: {}", list(retries))
+                results = await asyncio.gather(*retries.values(), return_exceptions=True)
+                retried = {}
+                # A single failed sub-call must not sink the whole advice
+                for section, result in zip(retries, results):
+                    if isinstance(result, Exception):
+                        logger.warning("Advice section {} failed: {}", section, result)
+                        result = self._visa_fallback(country) if section == "visa" else {}
+                    retried[section] = result
+                
+                executive_summary = retried.get("executive_summary", executive_summary)
+                improvement_plan = retried.get("improvement_plan", improvement_plan)
+                visa_info = retried.get("visa", visa_info)
             
             # Generate application timeline
             application_timeline = await self._create_application_timeline(
                 prioritized_scholarships, improvement_plan
             )
-            
-            # Research visa and administrative requirements
-            visa_info = await self._research_visa_requirements(
-                student_info.get("target_country", "")
-            )
-            
+
             # Calculate success probability
             success_analysis = await self._analyze_success_probability(
                 profile_analysis, prioritized_scholarships, improvement_plan
             )
-            
+
             # Create final recommendations
             final_recommendations = await self._create_final_recommendations(
                 executive_summary, prioritized_scholarships, improvement_plan,
@@ -102,34 +361,141 @@ class AdvisorAgent:
             }
             
         except Exception as e:
-            logger.error(f"Error generating comprehensive advice: {str(e)}")
+            logger.error("Error generating comprehensive advice: {}", e)
             return {
                 "success": False,
                 "error": str(e),
                 "final_recommendations": {}
             }
     
+    async def _create_no_scholarship_advice(
+        self,
+        student_info: Dict[str, Any],
+        profile_analysis: Dict[str, Any],
+        user_email: Optional[str] = None,
+        stream_callback: Optional[Callable[[str, str], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """Tư vấn rút gọn khi không tìm được học bổng - chỉ giữ kế hoạch cải thiện hồ sơ"""
+        
+        logger.info("No scholarships found, skipping summary and visa research")
+        
+        try:
+            improvement_plan = await self._create_improvement_plan(
+                profile_analysis, [],
+                on_token=bind_stream_section(stream_callback, "improvement_plan")
+            )
+        except Exception as e:
+            logger.warning("Improvement plan failed: {}", e)
+            improvement_plan = {}
+        
+        executive_summary = {
+            "overall_assessment": "Không tìm được học bổng phù hợp — cần mở rộng tiêu chí tìm kiếm (quốc gia, ngành học hoặc bậc học)."
+        }
+        application_timeline = await self._create_application_timeline([], improvement_plan)
+        success_analysis = await self._analyze_success_probability(
+            profile_analysis, [], improvement_plan
+        )
+        final_recommendations = await self._create_final_recommendations(
+            executive_summary, [], improvement_plan,
+            application_timeline, {}, success_analysis
+        )
+        
+        email_sent = False
+        if user_email:
+            email_sent = await self._send_comprehensive_email(
+                user_email, student_info, final_recommendations
+            )
+        
+        return {
+            "success": True,
+            "executive_summary": executive_summary,
+            "prioritized_scholarships": [],
+            "improvement_plan": improvement_plan,
+            "application_timeline": application_timeline,
+            "visa_requirements": {},
+            "success_analysis": success_analysis,
+            "final_recommendations": final_recommendations,
+            "email_sent": email_sent
+        }
+    
+    async def _create_combined_analysis(
+        self,
+        student_info: Dict[str, Any],
+        scholarship_analysis: Dict[str, Any],
+        profile_analysis: Dict[str, Any],
+        financial_analysis: Dict[str, Any],
+        prioritized_scholarships: List[Dict[str, Any]],
+        country: str,
+        visa_content: Optional[str] = None,
+        student_info_json: Optional[str] = None,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """Tạo tóm tắt, kế hoạch cải thiện (và visa) trong một lần gọi LLM"""
+        
+        if student_info_json is None:
+            student_info_json = dumps_json(student_info)
+        include_visa = visa_content is not None
+        improvement_recs = profile_analysis.get("improvement_recommendations", {})
+        scholarship_requirements = [s.get("requirements", {}) for s in prioritized_scholarships[:3]]
+        financial_summary = financial_analysis.get("financial_summary", {})
+        
+        if include_visa:
+            schema, system_prompt = COMBINED_WITH_VISA_SCHEMA, COMBINED_WITH_VISA_SYSTEM_PROMPT
+        else:
+            schema, system_prompt = COMBINED_ANALYSIS_SCHEMA, COMBINED_SYSTEM_PROMPT
+        
+        visa_section = f"""
+                Quốc gia: {country}
+                Thông tin visa tìm được: {visa_content}
+                """ if include_visa else ""
+        
+        messages = [
+            {
+                "role": "user",
+                "content": f"""
+                Thông tin học sinh: {student_info_json}
+                
+                Phân tích học bổng: Tìm được {scholarship_analysis.get('recommended_count', 0)} học bổng phù hợp
+                
+                Phân tích hồ sơ: Điểm tổng thể {profile_analysis.get('overall_score', {}).get('total_score', 0)}/100
+                
+                Phân tích tài chính: Chi phí ước tính {financial_summary.get('total_program_cost', 0):,.0f} {financial_summary.get('currency', 'VND')}
+                
+                Gợi ý cải thiện từ phân tích hồ sơ: {dumps_json(improvement_recs)}
+                
+                Yêu cầu học bổng hàng đầu: {dumps_json(scholarship_requirements)}
+                {visa_section}
+                Tạo tóm tắt tổng quan, kế hoạch cải thiện hồ sơ theo timeline cụ thể{" và trích xuất thông tin visa du học" if include_visa else ""}.
+                """
+            }
+        ]
+        
+        return await self.llm.get_structured_response(
+            messages=messages,
+            system_prompt=system_prompt,
+            schema=schema,
+            on_token=on_token
+        )
+    
     async def _create_executive_summary(
         self,
         student_info: Dict[str, Any],
         scholarship_analysis: Dict[str, Any],
         profile_analysis: Dict[str, Any],
-        financial_analysis: Dict[str, Any]
+        financial_analysis: Dict[str, Any],
+        student_info_json: Optional[str] = None,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """Tạo tóm tắt tổng quan"""
         
-        system_prompt = f"""
-        {ADVISOR_PROMPT}
-        
-        Tạo tóm tắt tổng quan ngắn gọn và súc tích cho phiên tư vấn học bổng.
-        Tập trung vào những điểm quan trọng nhất và kết luận chính.
-        """
+        if student_info_json is None:
+            student_info_json = dumps_json(student_info)
         
         messages = [
             {
                 "role": "user",
                 "content": f"""
-                Thông tin học sinh: {json.dumps(student_info, ensure_ascii=False)}
+                Thông tin học sinh: {student_info_json}
                 
                 Phân tích học bổng: Tìm được {scholarship_analysis.get('recommended_count', 0)} học bổng phù hợp
                 
@@ -144,21 +510,9 @@ class AdvisorAgent:
         
         response = await self.llm.get_structured_response(
             messages=messages,
-            system_prompt=system_prompt,
-            schema={
-                "key_findings": [
-                    {
-                        "category": "string (academic/financial/opportunities/challenges)",
-                        "finding": "string",
-                        "impact": "string (high/medium/low)"
-                    }
-                ],
-                "overall_assessment": "string",
-                "top_opportunities": ["list of top 3 opportunities"],
-                "main_challenges": ["list of main challenges"],
-                "recommended_focus": "string",
-                "success_outlook": "string (very_positive/positive/moderate/challenging)"
-            }
+            system_prompt=EXECUTIVE_SUMMARY_SYSTEM_PROMPT,
+            on_token=on_token,
+            schema=EXECUTIVE_SUMMARY_SCHEMA
         )
         
         return response
@@ -171,37 +525,44 @@ class AdvisorAgent:
     ) -> List[Dict[str, Any]]:
         """Sắp xếp ưu tiên học bổng"""
         
-        scholarships = scholarship_analysis.get("scholarships", [])
+        # Cheap pre-filter: drop weak matches and deadlines that have already passed
+        today = date.today()
+        scholarships = [
+            s for s in scholarship_analysis.get("scholarships", [])
+            if s.get("final_match_score", 50) >= MIN_PRIORITY_MATCH_SCORE
+            and not _deadline_passed(s.get("deadline", ""), today)
+        ]
         profile_score = profile_analysis.get("overall_score", {}).get("total_score", 50)
         
+        # Profile compatibility is the same for every scholarship
+        if profile_score >= 70:
+            profile_bonus = 15
+        elif profile_score >= 50:
+            profile_bonus = 10
+        else:
+            profile_bonus = 0
+        
         prioritized = []
         
         for scholarship in scholarships:
-            # Calculate comprehensive priority score
-            priority_score = 0
+            # Lowercase each field exactly once per scholarship
+            name_text = scholarship.get("name", "").lower()
+            value_text = scholarship.get("value", "").lower()
+            deadline = scholarship.get("deadline", "").lower()
             
             # Match score from scholarship finder
-            match_score = scholarship.get("final_match_score", 50)
-            priority_score += match_score * 0.4
+            priority_score = scholarship.get("final_match_score", 50) * 0.4 + profile_bonus
             
             # Financial value
-            value_text = scholarship.get("value", "").lower()
-            if "full" in value_text or "100%" in value_text:
+            if any(token in value_text for token in FULL_VALUE_TOKENS):
                 priority_score += 30
-            elif "50%" in value_text or "partial" in value_text:
+            elif any(token in value_text for token in PARTIAL_VALUE_TOKENS):
                 priority_score += 20
             
-            # Profile compatibility
-            if profile_score >= 70:
-                priority_score += 15
-            elif profile_score >= 50:
+            # Deadline urgency - early deadlines get priority
+            if any(month in deadline for month in EARLY_DEADLINE_MONTHS):
                 priority_score += 10
             
-            # Deadline urgency
-            deadline = scholarship.get("deadline", "").lower()
-            if any(month in deadline for month in ["january", "february", "march"]):
-                priority_score += 10  # Early deadlines get priority
-            
             # Determine priority level
             if priority_score >= 80:
                 priority = "high"
@@ -210,70 +571,48 @@ class AdvisorAgent:
             else:
                 priority = "low"
             
-            prioritized.append({
-                **scholarship,
-                "priority": priority,
-                "priority_score": round(priority_score, 1),
-                "recommendation_reason": self._get_recommendation_reason(
-                    scholarship, priority, profile_score
+            # Annotate in place - the added keys are purely additive for other readers
+            scholarship.update(
+                priority=priority,
+                priority_score=round(priority_score, 1),
+                recommendation_reason=self._get_recommendation_reason(
+                    name_text, value_text, priority, profile_score
                 )
-            })
-        
-        # Sort by priority score
-        prioritized.sort(key=lambda x: x["priority_score"], reverse=True)
+            )
+            prioritized.append(scholarship)
         
-        return prioritized[:8]  # Top 8 scholarships
+        # Top 8 scholarships by priority score
+        return heapq.nlargest(8, prioritized, key=lambda x: x["priority_score"])
     
     def _get_recommendation_reason(
         self,
-        scholarship: Dict[str, Any],
+        name: str,
+        value: str,
         priority: str,
         profile_score: float
     ) -> str:
-        """Tạo lý do đề xuất học bổng"""
-        
-        reasons = []
-        
-        if priority == "high":
-            reasons.append("Độ phù hợp cao với hồ sơ của bạn")
+        """Tạo lý do đề xuất học bổng (name/value đã lowercase)"""
         
-        value = scholarship.get("value", "").lower()
-        if "full" in value:
-            reasons.append("Học bổng toàn phần, tiết kiệm tối đa chi phí")
-        elif "50%" in value:
-            reasons.append("Giá trị học bổng cao")
-        
-        if profile_score >= 70:
-            reasons.append("Hồ sơ của bạn có thể cạnh tranh tốt")
-        
-        name = scholarship.get("name", "").lower()
-        if any(keyword in name for keyword in ["vietnam", "vietnamese"]):
-            reasons.append("Dành riêng cho sinh viên Việt Nam")
-        
-        return "; ".join(reasons) if reasons else "Phù hợp với ngành học và quốc gia mục tiêu"
+        return _build_recommendation_reason(name, value, priority, profile_score >= 70)
     
     async def _create_improvement_plan(
         self,
         profile_analysis: Dict[str, Any],
-        prioritized_scholarships: List[Dict[str, Any]]
+        prioritized_scholarships: List[Dict[str, Any]],
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """Tạo kế hoạch cải thiện hồ sơ"""
         
         improvement_recs = profile_analysis.get("improvement_recommendations", {})
         scholarship_requirements = [s.get("requirements", {}) for s in prioritized_scholarships[:3]]
         
-        system_prompt = """
-        Tạo kế hoạch cải thiện hồ sơ cụ thể và có thể thực hiện.
-        Ưu tiên các hành động có impact cao và phù hợp với sinh viên Việt Nam.
-        """
-        
         messages = [
             {
                 "role": "user",
                 "content": f"""
-                Gợi ý cải thiện từ phân tích hồ sơ: {json.dumps(improvement_recs, ensure_ascii=False)}
+                Gợi ý cải thiện từ phân tích hồ sơ: {dumps_json(improvement_recs)}
                 
-                Yêu cầu học bổng hàng đầu: {json.dumps(scholarship_requirements, ensure_ascii=False)}
+                Yêu cầu học bổng hàng đầu: {dumps_json(scholarship_requirements)}
                 
                 Tạo kế hoạch cải thiện hồ sơ theo timeline cụ thể.
                 """
@@ -282,41 +621,9 @@ class AdvisorAgent:
         
         response = await self.llm.get_structured_response(
             messages=messages,
-            system_prompt=system_prompt,
-            schema={
-                "immediate_actions": [
-                    {
-                        "action": "string",
-                        "timeline": "string",
-                        "priority": "string (high/medium/low)",
-                        "cost": "string",
-                        "expected_impact": "string"
-                    }
-                ],
-                "short_term_goals": [
-                    {
-                        "goal": "string",
-                        "timeline": "string",
-                        "steps": ["list of steps"],
-                        "resources_needed": ["list"],
-                        "success_metrics": "string"
-                    }
-                ],
-                "long_term_objectives": [
-                    {
-                        "objective": "string",
-                        "timeline": "string",
-                        "preparation": ["list"],
-                        "milestones": ["list"]
-                    }
-                ],
-                "monthly_checklist": {
-                    "month_1": ["list of tasks"],
-                    "month_2": ["list of tasks"],
-                    "month_3": ["list of tasks"],
-                    "month_6": ["list of tasks"]
-                }
-            }
+            system_prompt=IMPROVEMENT_PLAN_SYSTEM_PROMPT,
+            on_token=on_token,
+            schema=IMPROVEMENT_PLAN_SCHEMA
         )
         
         return response
@@ -341,33 +648,31 @@ class AdvisorAgent:
         
         # Create month-by-month timeline
         current_date = datetime.now()
-        timeline = {}
-        
-        for i in range(12):
-            month_date = current_date + timedelta(days=30*i)
-            month_key = month_date.strftime("%Y-%m")
-            month_name = month_date.strftime("%B %Y")
-            
-            timeline[month_key] = {
-                "month_name": month_name,
+        months = [current_date + relativedelta(months=+i) for i in range(12)]
+        timeline = {
+            month_date.strftime("%Y-%m"): {
+                "month_name": month_date.strftime("%B %Y"),
                 "scholarship_deadlines": [],
                 "preparation_tasks": [],
                 "milestones": []
             }
+            for month_date in months
+        }
         
         # Populate timeline with scholarship deadlines
         for deadline_info in deadlines:
-            # Simplified deadline parsing - in real implementation, use proper date parsing
-            deadline_month = current_date + timedelta(days=60)  # Placeholder
-            month_key = deadline_month.strftime("%Y-%m")
+            deadline_date = _parse_deadline(deadline_info["deadline"], current_date.date())
+            if deadline_date is None:
+                continue
             
+            month_key = deadline_date.strftime("%Y-%m")
             if month_key in timeline:
                 timeline[month_key]["scholarship_deadlines"].append(deadline_info)
         
         # Add preparation tasks from improvement plan
         immediate_actions = improvement_plan.get("immediate_actions", [])
+        first_month = months[0].strftime("%Y-%m")
         for action in immediate_actions:
-            first_month = list(timeline.keys())[0]
             timeline[first_month]["preparation_tasks"].append(action["action"])
         
         return {
@@ -380,65 +685,105 @@ class AdvisorAgent:
             }
         }
     
+    def _visa_cache_key(self, country: str) -> str:
+        """Cache key for extracted visa requirements"""
+        return f"visa:v1:{country.lower().strip()}"
+    
+    async def _search_visa_content(self, country: str) -> str:
+        """Tìm kiếm thông tin visa (cache kết quả search riêng)"""
+        
+        search_cache_key = f"search:visa:{country.lower().strip()}"
+        visa_results = await self.cache.get_cached(search_cache_key)
+        if visa_results is None:
+            visa_results = await self.search_tool.search_visa_requirements(
+                country=country,
+                nationality="Vietnam"
+            )
+            if visa_results:
+                await self.cache.set_cached(
+                    search_cache_key, visa_results, self.visa_search_cache_ttl
+                )
+        
+        return "\n".join([
+            f"{result.get('title', '')}: {result.get('snippet', '')}"
+            for result in visa_results
+        ])
+    
+    async def _prepare_visa_context(self, country: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Chuẩn bị dữ liệu visa trước khi gọi LLM
+        
+        Returns:
+            (visa_info, visa_content): visa_info đã có sẵn (cache/không có quốc gia/lỗi)
+            hoặc None nếu cần LLM trích xuất từ visa_content
+        """
+        
+        if not country:
+            return {"visa_info": "Chưa xác định quốc gia"}, None
+        
+        cached_visa = await self.cache.get_cached(self._visa_cache_key(country))
+        if cached_visa is not None:
+            logger.info("Using cached visa requirements for: {}", country)
+            return cached_visa, None
+        
+        try:
+            return None, await self._search_visa_content(country)
+        except Exception as e:
+            logger.warning("Could not research visa requirements: {}", e)
+            return self._visa_fallback(country), None
+    
+    def _visa_fallback(self, country: str) -> Dict[str, Any]:
+        """Thông tin visa mặc định khi không nghiên cứu được"""
+        return {
+            "visa_info": f"Cần tìm hiểu thêm về visa du học {country}",
+            "recommendation": "Liên hệ đại sứ quán để biết thông tin chính xác"
+        }
+    
+    async def _extract_visa_requirements(
+        self,
+        country: str,
+        visa_content: str
+    ) -> Dict[str, Any]:
+        """Trích xuất yêu cầu visa từ kết quả tìm kiếm"""
+        
+        messages = [
+            {
+                "role": "user",
+                "content": f"""
+                Quốc gia: {country}
+                Thông tin visa tìm được: {visa_content}
+                
+                Trích xuất thông tin visa du học.
+                """
+            }
+        ]
+        
+        response = await self.llm.get_structured_response(
+            messages=messages,
+            system_prompt=VISA_SYSTEM_PROMPT,
+            schema=VISA_SCHEMA
+        )
+        
+        if visa_content:
+            await self.cache.set_cached(self._visa_cache_key(country), response, self.visa_cache_ttl)
+        
+        return response
+    
     async def _research_visa_requirements(
         self,
         country: str
     ) -> Dict[str, Any]:
         """Nghiên cứu yêu cầu visa"""
         
-        if not country:
-            return {"visa_info": "Chưa xác định quốc gia"}
+        visa_info, visa_content = await self._prepare_visa_context(country)
+        if visa_info is not None:
+            return visa_info
         
         try:
-            visa_results = await self.search_tool.search_visa_requirements(
-                country=country,
-                nationality="Vietnam"
-            )
-            
-            # Analyze visa information
-            visa_content = "\n".join([
-                f"{result.get('title', '')}: {result.get('snippet', '')}"
-                for result in visa_results
-            ])
-            
-            system_prompt = """
-            Trích xuất thông tin visa du học cho sinh viên Việt Nam.
-            Tập trung vào yêu cầu, thủ tục, và timeline.
-            """
-            
-            messages = [
-                {
-                    "role": "user",
-                    "content": f"""
-                    Quốc gia: {country}
-                    Thông tin visa tìm được: {visa_content}
-                    
-                    Trích xuất thông tin visa du học.
-                    """
-                }
-            ]
-            
-            response = await self.llm.get_structured_response(
-                messages=messages,
-                system_prompt=system_prompt,
-                schema={
-                    "visa_type": "string",
-                    "requirements": ["list of requirements"],
-                    "documents_needed": ["list of documents"],
-                    "processing_time": "string",
-                    "fees": "string",
-                    "important_notes": ["list of notes"]
-                }
-            )
-            
-            return response
-            
+            return await self._extract_visa_requirements(country, visa_content)
         except Exception as e:
-            logger.warning(f"Could not research visa requirements: {str(e)}")
-            return {
-                "visa_info": f"Cần tìm hiểu thêm về visa du học {country}",
-                "recommendation": "Liên hệ đại sứ quán để biết thông tin chính xác"
-            }
+            logger.warning("Could not research visa requirements: {}", e)
+            return self._visa_fallback(country)
     
     async def _analyze_success_probability(
         self,
@@ -449,32 +794,12 @@ class AdvisorAgent:
         """Phân tích xác suất thành công"""
         
         profile_score = profile_analysis.get("overall_score", {}).get("total_score", 50)
-        high_priority_scholarships = [s for s in prioritized_scholarships if s.get("priority") == "high"]
-        
-        # Calculate base success probability
-        if profile_score >= 80:
-            base_probability = 0.8
-        elif profile_score >= 65:
-            base_probability = 0.6
-        elif profile_score >= 50:
-            base_probability = 0.4
-        else:
-            base_probability = 0.2
-        
-        # Adjust for scholarship fit
-        if len(high_priority_scholarships) >= 3:
-            scholarship_boost = 0.15
-        elif len(high_priority_scholarships) >= 1:
-            scholarship_boost = 0.1
-        else:
-            scholarship_boost = 0
-        
-        # Improvement plan impact
+        high_priority_count = sum(1 for s in prioritized_scholarships if s.get("priority") == "high")
         immediate_actions = len(improvement_plan.get("immediate_actions", []))
-        improvement_boost = min(immediate_actions * 0.05, 0.2)
         
-        # Calculate final probability
-        success_probability = min(base_probability + scholarship_boost + improvement_boost, 0.95)
+        success_probability, base_probability, scholarship_boost, improvement_boost = (
+            calculate_success_probability(profile_score, high_priority_count, immediate_actions)
+        )
         
         return {
             "overall_success_probability": round(success_probability, 2),
@@ -546,7 +871,7 @@ class AdvisorAgent:
             )
             
         except Exception as e:
-            logger.error(f"Error sending comprehensive email: {str(e)}")
+            logger.error("Error sending comprehensive email: {}", e)
             return False
 
 # Global advisor instance
@@ -4,25 +4,181 @@ Nhiệm vụ: Nhận yêu cầu, phân tích thông tin, điều phối các age
 """
 import os
 import asyncio
-import json
-from typing import Dict, List, Any, Optional
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
 from loguru import logger
 
 from ..utils.llm_client import llm_manager
+from ..utils.json_utils import dumps_json
+from ..config.settings import settings
 from ..config.prompts import COORDINATOR_PROMPT, VIETNAMESE_STUDENT_CONTEXT
 from ..tools.file_processor import file_processor
 
+ANALYSIS_SCHEMA = {
+    "target_country": "string",
+    "field_of_study": "string",
+    "degree_level": "string",
+    "budget_range": "string",
+    "profile_summary": "string",
+    "completeness_score": "number 0-100",
+    "missing_info": ["list of missing information"],
+    "clarification_questions": ["list of questions to ask user"]
+}
+
+CLARIFICATION_SCHEMA = {
+    "target_country": "string",
+    "field_of_study": "string",
+    "degree_level": "string",
+    "budget_range": "string",
+    "profile_summary": "string",
+    "completeness_score": "number 0-100",
+    "updated_info": "string describing what was updated",
+    "ready_for_processing": "boolean"
+}
+
+# System prompts are constant for the process lifetime - build them once at import
+ANALYZE_SYSTEM_PROMPT = f"""
+{COORDINATOR_PROMPT}
+
+{VIETNAMESE_STUDENT_CONTEXT}
+
+Hãy phân tích yêu cầu của học sinh và trích xuất thông tin quan trọng.
+"""
+
+CLARIFY_SYSTEM_PROMPT = f"""
+{COORDINATOR_PROMPT}
+
+Bạn đã phân tích yêu cầu ban đầu và nhận được thêm thông tin từ học sinh.
+Hãy cập nhật và hoàn thiện thông tin.
+"""
+
+# Plan tiers, checked top-down: (min completeness, requires files, complexity, estimated seconds)
+PLAN_TIERS = (
+    (80, True, "low", 180),      # 3 minutes
+    (60, False, "medium", 300),  # 5 minutes
+    (0, False, "high", 600)      # 10 minutes
+)
+
+def _plan_tier(completeness: float, has_files: bool) -> Tuple[str, int]:
+    """(complexity, estimated seconds) of the first tier the request qualifies for"""
+    for threshold, requires_files, complexity, estimated_time in PLAN_TIERS:
+        if completeness >= threshold and (has_files or not requires_files):
+            return complexity, estimated_time
+    return PLAN_TIERS[-1][2:]
+
+# Below this completeness the student must clarify before any downstream agent runs
+CLARIFICATION_THRESHOLD = 70
+
+# Downstream workflow as a DAG: steps whose dependencies are satisfied run concurrently
+AGENT_WORKFLOW = (
+    {
+        "step": "scholarship_search",
+        "description": "Tìm kiếm học bổng phù hợp",
+        "agent": "ScholarshipFinderAgent",
+        "depends_on": []
+    },
+    {
+        "step": "profile_analysis",
+        "description": "Phân tích hồ sơ học sinh",
+        "agent": "ProfileAnalyzerAgent",
+        "depends_on": ["scholarship_search"]
+    },
+    {
+        "step": "financial_calculation",
+        "description": "Tính toán chi phí và tài chính",
+        "agent": "FinancialCalculatorAgent",
+        "depends_on": ["scholarship_search"]
+    },
+    {
+        "step": "comprehensive_advice",
+        "description": "Tư vấn tổng hợp và kế hoạch hành động",
+        "agent": "AdvisorAgent",
+        "depends_on": ["scholarship_search", "profile_analysis", "financial_calculation"]
+    }
+)
+
+def _workflow_stages(steps) -> List[List[str]]:
+    """Group workflow steps into stages; steps within a stage can run concurrently"""
+    stages = []
+    done = set()
+    pending = list(steps)
+    
+    while pending:
+        ready = [s for s in pending if set(s["depends_on"]) <= done]
+        if not ready:
+            raise ValueError("Workflow has a dependency cycle or an unknown dependency")
+        stages.append([s["agent"] for s in ready])
+        done.update(s["step"] for s in ready)
+        pending = [s for s in pending if s not in ready]
+    
+    return stages
+
+AGENT_STAGES = _workflow_stages(AGENT_WORKFLOW)
+
+PROGRESS_MESSAGES = {
+    "analyzing": "🧠 Đang phân tích yêu cầu của bạn...",
+    "processing_files": "📄 Đang xử lý hồ sơ của bạn...",
+    "creating_plan": "📋 Đang tạo kế hoạch tư vấn...",
+    "searching_scholarships": "🔍 Đang tìm kiếm học bổng phù hợp...",
+    "analyzing_profile": "📊 Đang phân tích điểm mạnh của bạn...",
+    "calculating_costs": "💰 Đang tính toán chi phí du học...",
+    "generating_advice": "🎯 Đang tạo tư vấn cá nhân hóa...",
+    "finalizing": "✨ Đang hoàn thiện kết quả..."
+}
+DEFAULT_PROGRESS_MESSAGE = "⚙️ Đang xử lý..."
+
+# Số phân tích yêu cầu được giữ lại (LRU) để tránh gọi lại LLM cho tin nhắn trùng
+ANALYSIS_CACHE_SIZE = 1024
+
+# Số hồ sơ đã xử lý được giữ lại theo nội dung file (upload lại cùng file sau khi sửa lỗi)
+PROFILE_CACHE_SIZE = 16
+
+def _file_digest(file_path: str) -> str:
+    """blake2b digest of a file's bytes, read in chunks (blocking)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def _run_all_or_cancel(*coros) -> List[Any]:
+    """
+    Run coroutines concurrently and return their results in order.
+    The first failure cancels the siblings still in flight and is re-raised.
+    """
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(coro) for coro in coros]
+    except BaseExceptionGroup as eg:
+        raise eg.exceptions[0]
+    return [task.result() for task in tasks]
+
 class CoordinatorAgent:
     """Agent điều phối trung tâm"""
     
+    # Fixed attribute layout - no per-instance __dict__
+    __slots__ = ("name", "llm", "_file_semaphore", "_analysis_cache", "_profile_cache")
+    
     def __init__(self):
         self.name = "CoordinatorAgent"
         self.llm = llm_manager
+        self._file_semaphore: Optional[asyncio.Semaphore] = None
+        self._analysis_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._profile_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        
+    @property
+    def file_semaphore(self) -> asyncio.Semaphore:
+        """Shared cap on concurrently processed files (created lazily inside the event loop)"""
+        if self._file_semaphore is None:
+            self._file_semaphore = asyncio.Semaphore(settings.FILE_PROCESSING_CONCURRENCY)
+        return self._file_semaphore
         
     async def process_initial_request(
         self,
         user_message: str,
-        uploaded_files: Optional[List[str]] = None
+        uploaded_files: Optional[List[str]] = None,
+        max_concurrency: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Xử lý yêu cầu ban đầu từ học sinh
@@ -30,23 +186,29 @@ class CoordinatorAgent:
         Args:
             user_message: Tin nhắn từ học sinh
             uploaded_files: Danh sách file upload (nếu có)
+            max_concurrency: Số file xử lý song song tối đa (mặc định theo settings)
             
         Returns:
             Thông tin đã phân tích và kế hoạch xử lý
         """
-        logger.info(f"Coordinator processing request: {user_message[:100]}...")
+        logger.info("Coordinator processing request: {}...", user_message[:100])
         
         try:
-            # Phân tích yêu cầu ban đầu
-            analysis_result = await self._analyze_user_request(user_message)
-            
-            # Xử lý file upload nếu có
-            file_analysis = {}
+            # Phân tích yêu cầu và xử lý file upload song song (hai bước độc lập)
+            # (lỗi ở một bước sẽ huỷ bước còn lại)
+            analysis_coro = self._analyze_user_request(user_message)
             if uploaded_files:
-                file_analysis = await self._process_uploaded_files(uploaded_files)
+                analysis_result, file_analysis = await _run_all_or_cancel(
+                    analysis_coro,
+                    self._process_uploaded_files(uploaded_files, max_concurrency)
+                )
+            else:
+                analysis_result = await analysis_coro
+                file_analysis = {}
             
             # Tạo kế hoạch xử lý
-            processing_plan = self._create_processing_plan(analysis_result, file_analysis)
+            completeness = analysis_result.get("completeness_score", 50)
+            processing_plan = self._create_processing_plan(analysis_result, file_analysis, completeness)
             
             return {
                 "success": True,
@@ -54,27 +216,45 @@ class CoordinatorAgent:
                 "analysis": analysis_result,
                 "file_analysis": file_analysis,
                 "processing_plan": processing_plan,
-                "next_agents": self._determine_next_agents(analysis_result)
+                "next_agents": self._determine_next_agents(completeness)
             }
             
         except Exception as e:
-            logger.error(f"Error in coordinator: {str(e)}")
+            logger.error("Error in coordinator: {}", e)
             return {
                 "success": False,
                 "error": str(e),
                 "user_request": user_message
             }
     
+    @staticmethod
+    def _analysis_cache_key(user_message: str) -> str:
+        """Content hash of a normalized user message"""
+        normalized = user_message.strip().lower().encode()
+        return hashlib.blake2b(normalized, digest_size=16).hexdigest()
+    
     async def _analyze_user_request(self, user_message: str) -> Dict[str, Any]:
-        """Phân tích yêu cầu của người dùng"""
+        """Phân tích yêu cầu của người dùng (có cache theo nội dung tin nhắn)"""
         
-        system_prompt = f"""
-        {COORDINATOR_PROMPT}
+        cache_key = self._analysis_cache_key(user_message)
+        cached = self._analysis_cache.get(cache_key)
+        if cached is not None:
+            self._analysis_cache.move_to_end(cache_key)
+            logger.info("Using cached request analysis")
+            return dict(cached)
         
-        {VIETNAMESE_STUDENT_CONTEXT}
+        response = await self._request_analysis(user_message)
         
-        Hãy phân tích yêu cầu của học sinh và trích xuất thông tin quan trọng.
-        """
+        # Default response (LLM/parse failure) has completeness 0 - don't pin it in cache
+        if response.get("completeness_score"):
+            self._analysis_cache[cache_key] = response
+            if len(self._analysis_cache) > ANALYSIS_CACHE_SIZE:
+                self._analysis_cache.popitem(last=False)
+        
+        return dict(response)
+    
+    async def _request_analysis(self, user_message: str) -> Dict[str, Any]:
+        """Gọi LLM phân tích yêu cầu của người dùng"""
         
         messages = [
             {
@@ -85,70 +265,36 @@ class CoordinatorAgent:
         
         response = await self.llm.get_structured_response(
             messages=messages,
-            system_prompt=system_prompt,
-            schema={
-                "target_country": "string",
-                "field_of_study": "string", 
-                "degree_level": "string",
-                "budget_range": "string",
-                "profile_summary": "string",
-                "completeness_score": "number 0-100",
-                "missing_info": ["list of missing information"],
-                "clarification_questions": ["list of questions to ask user"]
-            }
+            system_prompt=ANALYZE_SYSTEM_PROMPT,
+            schema=ANALYSIS_SCHEMA
         )
         
         return response
     
-    async def _process_uploaded_files(self, file_paths: List[str]) -> Dict[str, Any]:
-        """Xử lý các file được upload"""
+    async def _process_uploaded_files(
+        self,
+        file_paths: List[str],
+        max_concurrency: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Xử lý các file được upload (song song, giới hạn bởi semaphore)"""
         
-        file_results = []
+        semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else self.file_semaphore
         
-        for file_path in file_paths:
-            try:
-                # Validate file
-                file_size = os.path.getsize(file_path)
-                validation = file_processor.validate_file(file_path, file_size)
-                
-                if not validation["valid"]:
-                    file_results.append({
-                        "file": file_path,
-                        "success": False,
-                        "errors": validation["errors"]
-                    })
-                    continue
-                
-                # Process file
-                processing_result = await file_processor.process_student_profile(file_path)
-                
-                if processing_result["success"]:
-                    # Calculate profile score
-                    profile_score = file_processor.calculate_profile_score(
-                        processing_result["profile"]
-                    )
-                    
-                    file_results.append({
-                        "file": file_path,
-                        "success": True,
-                        "profile": processing_result["profile"],
-                        "score": profile_score,
-                        "content_preview": processing_result["raw_content"]
-                    })
-                else:
-                    file_results.append({
-                        "file": file_path,
-                        "success": False,
-                        "error": processing_result["error"]
-                    })
-                    
-            except Exception as e:
-                logger.error(f"Error processing file {file_path}: {str(e)}")
-                file_results.append({
+        results = await asyncio.gather(
+            *[self._process_one(file_path, semaphore) for file_path in file_paths],
+            return_exceptions=True
+        )
+        
+        file_results = []
+        for file_path, result in zip(file_paths, results):
+            if isinstance(result, Exception):
+                logger.error("Error processing file {}: {}", file_path, result)
+                result = {
                     "file": file_path,
                     "success": False,
-                    "error": str(e)
-                })
+                    "error": str(result)
+                }
+            file_results.append(result)
         
         return {
             "total_files": len(file_paths),
@@ -156,82 +302,119 @@ class CoordinatorAgent:
             "results": file_results
         }
     
+    async def _process_one(self, file_path: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        """Xử lý một file upload"""
+        
+        async with semaphore:
+            return await self._process_file(file_path)
+    
+    @staticmethod
+    async def _validate(file_path: str) -> Dict[str, Any]:
+        """Stat + validate a file in one worker-thread hop, off the event loop"""
+        
+        def stat_and_validate() -> Dict[str, Any]:
+            return file_processor.validate_file(file_path, os.path.getsize(file_path))
+        
+        return await asyncio.to_thread(stat_and_validate)
+    
+    async def _process_file(self, file_path: str) -> Dict[str, Any]:
+        """Validate, trích xuất và chấm điểm một file"""
+        
+        validation = await self._validate(file_path)
+        
+        if not validation["valid"]:
+            return {
+                "file": file_path,
+                "success": False,
+                "errors": validation["errors"]
+            }
+        
+        # Same content (and type) as a recently processed upload -> reuse its result
+        file_type = validation["file_type"]
+        cache_key = f"{file_type}:{await asyncio.to_thread(_file_digest, file_path)}"
+        cached = self._profile_cache.get(cache_key)
+        if cached is not None:
+            self._profile_cache.move_to_end(cache_key)
+            logger.info("Using cached profile for {}", file_path)
+            return {"file": file_path, "success": True, **cached}
+        
+        # Process file
+        processing_result = await file_processor.process_student_profile(file_path)
+        
+        if not processing_result["success"]:
+            return {
+                "file": file_path,
+                "success": False,
+                "error": processing_result["error"]
+            }
+        
+        # Calculate profile score
+        profile_score = file_processor.calculate_profile_score(
+            processing_result["profile"]
+        )
+        
+        payload = {
+            "profile": processing_result["profile"],
+            "score": profile_score,
+            "content_preview": processing_result["raw_content"]
+        }
+        self._profile_cache[cache_key] = payload
+        if len(self._profile_cache) > PROFILE_CACHE_SIZE:
+            self._profile_cache.popitem(last=False)
+        
+        return {"file": file_path, "success": True, **payload}
+    
     def _create_processing_plan(
         self,
         analysis_result: Dict[str, Any],
-        file_analysis: Dict[str, Any]
+        file_analysis: Dict[str, Any],
+        completeness: float
     ) -> Dict[str, Any]:
-        """Tạo kế hoạch xử lý cho các agent tiếp theo"""
+        """
+        Tạo kế hoạch xử lý cho các agent tiếp theo
         
-        plan = {
-            "workflow_steps": [],
-            "estimated_time": 0,
-            "complexity": "medium"
-        }
+        Khi completeness thấp hơn CLARIFICATION_THRESHOLD, kế hoạch chỉ gồm bước
+        clarification và có blocked_on="clarification": các agent phía sau bị hoãn
+        (next_agents == ["clarification_needed"]) cho tới khi clarify_information
+        hoàn thiện thông tin.
+        """
         
         # Xác định độ phức tạp
-        completeness = analysis_result.get("completeness_score", 50)
         has_files = file_analysis.get("successful_files", 0) > 0
+        complexity, estimated_time = _plan_tier(completeness, has_files)
         
-        if completeness >= 80 and has_files:
-            plan["complexity"] = "low"
-            plan["estimated_time"] = 180  # 3 minutes
-        elif completeness >= 60:
-            plan["complexity"] = "medium" 
-            plan["estimated_time"] = 300  # 5 minutes
-        else:
-            plan["complexity"] = "high"
-            plan["estimated_time"] = 600  # 10 minutes
+        plan = {
+            "workflow_steps": [],
+            "estimated_time": estimated_time,
+            "complexity": complexity
+        }
         
         # Xác định các bước workflow
-        if completeness < 70:
+        if completeness < CLARIFICATION_THRESHOLD:
             plan["workflow_steps"].append({
                 "step": "clarification",
                 "description": "Cần làm rõ thông tin với học sinh",
                 "questions": analysis_result.get("clarification_questions", [])
             })
+            plan["blocked_on"] = "clarification"
+            return plan
         
-        plan["workflow_steps"].extend([
-            {
-                "step": "scholarship_search",
-                "description": "Tìm kiếm học bổng phù hợp",
-                "agent": "ScholarshipFinderAgent"
-            },
-            {
-                "step": "profile_analysis", 
-                "description": "Phân tích hồ sơ học sinh",
-                "agent": "ProfileAnalyzerAgent"
-            },
-            {
-                "step": "financial_calculation",
-                "description": "Tính toán chi phí và tài chính",
-                "agent": "FinancialCalculatorAgent"
-            },
-            {
-                "step": "comprehensive_advice",
-                "description": "Tư vấn tổng hợp và kế hoạch hành động",
-                "agent": "AdvisorAgent"
-            }
-        ])
+        plan["workflow_steps"].extend(
+            {**step, "depends_on": list(step["depends_on"])} for step in AGENT_WORKFLOW
+        )
+        plan["stages"] = [list(stage) for stage in AGENT_STAGES]
         
         return plan
     
-    def _determine_next_agents(self, analysis_result: Dict[str, Any]) -> List[str]:
+    def _determine_next_agents(self, completeness: float) -> List[str]:
         """Xác định thứ tự các agent tiếp theo"""
         
-        completeness = analysis_result.get("completeness_score", 50)
-        
-        if completeness < 70:
+        if completeness < CLARIFICATION_THRESHOLD:
             # Cần clarification trước
             return ["clarification_needed"]
         
-        # Workflow bình thường
-        return [
-            "ScholarshipFinderAgent",
-            "ProfileAnalyzerAgent", 
-            "FinancialCalculatorAgent",
-            "AdvisorAgent"
-        ]
+        # Workflow bình thường (thứ tự topo; xem processing_plan["stages"] để chạy song song)
+        return [agent for stage in AGENT_STAGES for agent in stage]
     
     async def clarify_information(
         self,
@@ -251,20 +434,13 @@ class CoordinatorAgent:
             Thông tin đã được làm rõ
         """
         
-        system_prompt = f"""
-        {COORDINATOR_PROMPT}
-        
-        Bạn đã phân tích yêu cầu ban đầu và nhận được thêm thông tin từ học sinh.
-        Hãy cập nhật và hoàn thiện thông tin.
-        """
-        
         messages = [
             {
                 "role": "user",
                 "content": f"""
                 Yêu cầu ban đầu: {original_request}
                 
-                Phân tích trước đó: {json.dumps(previous_analysis, ensure_ascii=False)}
+                Phân tích trước đó: {dumps_json(previous_analysis)}
                 
                 Thông tin bổ sung từ học sinh: {user_response}
                 
@@ -275,17 +451,8 @@ class CoordinatorAgent:
         
         response = await self.llm.get_structured_response(
             messages=messages,
-            system_prompt=system_prompt,
-            schema={
-                "target_country": "string",
-                "field_of_study": "string",
-                "degree_level": "string", 
-                "budget_range": "string",
-                "profile_summary": "string",
-                "completeness_score": "number 0-100",
-                "updated_info": "string describing what was updated",
-                "ready_for_processing": "boolean"
-            }
+            system_prompt=CLARIFY_SYSTEM_PROMPT,
+            schema=CLARIFICATION_SCHEMA
         )
         
         return response
@@ -293,18 +460,7 @@ class CoordinatorAgent:
     def get_progress_message(self, step: str) -> str:
         """Tạo thông báo tiến trình cho UI"""
         
-        progress_messages = {
-            "analyzing": "🧠 Đang phân tích yêu cầu của bạn...",
-            "processing_files": "📄 Đang xử lý hồ sơ của bạn...",
-            "creating_plan": "📋 Đang tạo kế hoạch tư vấn...",
-            "searching_scholarships": "🔍 Đang tìm kiếm học bổng phù hợp...",
-            "analyzing_profile": "📊 Đang phân tích điểm mạnh của bạn...",
-            "calculating_costs": "💰 Đang tính toán chi phí du học...",
-            "generating_advice": "🎯 Đang tạo tư vấn cá nhân hóa...",
-            "finalizing": "✨ Đang hoàn thiện kết quả..."
-        }
-        
-        return progress_messages.get(step, "⚙️ Đang xử lý...")
+        return PROGRESS_MESSAGES.get(step, DEFAULT_PROGRESS_MESSAGE)
 
 # Global coordinator instance
 coordinator_agent = CoordinatorAgent()
\ No newline at end of file
@@ -3,15 +3,205 @@ Financial Calculator Agent - Agent tính toán tài chính du học
 Nhiệm vụ: Tính toán chi phí du học, ước tính tiết kiệm từ học bổng, phân tích tài chính
 """
 import asyncio
-import json
-from typing import Dict, List, Any, Optional
+import re
+import time
+from typing import Dict, List, Any, Optional, Callable, Awaitable, Tuple
 from loguru import logger
 
-from ..utils.llm_client import llm_manager
+from ..utils.llm_client import llm_manager, bind_stream_section
+from ..utils.json_utils import dumps_json
+from ..utils.session_manager import session_manager
 from ..config.prompts import FINANCIAL_CALCULATOR_PROMPT
 from ..tools.currency_converter import currency_converter
 from ..tools.web_search import web_search_tool
 
+# Currency most cost estimates come back in (also the fallback in _calculate_base_costs)
+DEFAULT_BASE_CURRENCY = "USD"
+
+COST_ANALYSIS_SCHEMA = {
+    "tuition_fees": {
+        "min_per_year": "number",
+        "max_per_year": "number",
+        "average_per_year": "number",
+        "currency": "string",
+        "program_duration": "number (years)"
+    },
+    "living_costs": {
+        "accommodation": {"min": "number", "max": "number", "currency": "string"},
+        "food": {"min": "number", "max": "number", "currency": "string"},
+        "transportation": {"min": "number", "max": "number", "currency": "string"},
+        "personal_expenses": {"min": "number", "max": "number", "currency": "string"},
+        "total_per_year": {"min": "number", "max": "number", "currency": "string"}
+    },
+    "other_costs": {
+        "visa_fees": {"amount": "number", "currency": "string"},
+        "health_insurance": {"amount": "number", "currency": "string"},
+        "flights": {"amount": "number", "currency": "string"},
+        "books_supplies": {"amount": "number", "currency": "string"}
+    },
+    "total_estimated_cost": {
+        "min_total": "number",
+        "max_total": "number",
+        "realistic_estimate": "number",
+        "currency": "string"
+    }
+}
+
+RECOMMENDATIONS_SCHEMA = {
+    "affordability_assessment": "string (affordable/challenging/difficult)",
+    "funding_strategies": [
+        {
+            "strategy": "string",
+            "description": "string",
+            "potential_amount": "number",
+            "timeline": "string",
+            "difficulty": "string (easy/medium/hard)"
+        }
+    ],
+    "savings_plan": {
+        "monthly_savings_needed": "number",
+        "savings_duration": "string",
+        "total_family_contribution": "number"
+    },
+    "alternative_options": [
+        {
+            "option": "string",
+            "description": "string",
+            "cost_reduction": "number"
+        }
+    ],
+    "financial_timeline": [
+        {
+            "phase": "string",
+            "timeframe": "string",
+            "actions": ["list of actions"],
+            "target_amount": "number"
+        }
+    ]
+}
+
+# System prompts are built once at import so every call reuses the same string
+COST_ANALYSIS_SYSTEM_PROMPT = f"""
+{FINANCIAL_CALCULATOR_PROMPT}
+
+Phân tích thông tin chi phí du học và đưa ra ước tính chi tiết.
+Tập trung vào chi phí cho sinh viên quốc tế từ Việt Nam.
+"""
+
+RECOMMENDATIONS_SYSTEM_PROMPT = """
+Đưa ra lời khuyên tài chính thực tế cho du học sinh Việt Nam.
+Tập trung vào khả năng tài chính của gia đình Việt Nam và các nguồn tài trợ.
+"""
+
+FULL_SCHOLARSHIP_TOKENS = ("full", "100%", "toàn phần")
+ANNUAL_VALUE_TOKENS = ("per year", "annually", "yearly")
+# One pass over the value text tags every keyword category present
+VALUE_KEYWORD_PATTERN = re.compile(
+    "(?P<full>" + "|".join(map(re.escape, FULL_SCHOLARSHIP_TOKENS)) + ")"
+    "|(?P<annual>" + "|".join(map(re.escape, ANNUAL_VALUE_TOKENS)) + ")"
+)
+# Fallback for amounts written without a "$" sign
+AMOUNT_PATTERNS = (
+    re.compile(r'(\d+,?\d*)\s*usd', re.IGNORECASE),
+    re.compile(r'(\d+,?\d*)\s*dollars', re.IGNORECASE)
+)
+
+def _extract_percent(text: str) -> Optional[int]:
+    """First integer immediately followed by "%" (e.g. "50% tuition" -> 50)"""
+    end = text.find("%")
+    while end != -1:
+        start = end
+        while start > 0 and text[start - 1].isdecimal():
+            start -= 1
+        if start < end:
+            return int(text[start:end])
+        end = text.find("%", end + 1)
+    return None
+
+def _extract_dollar_amount(text: str) -> Optional[float]:
+    """First "$"-prefixed amount, thousands separators allowed ("$25,000" -> 25000.0)"""
+    sign = text.find("$")
+    while sign != -1:
+        end = sign + 1
+        while end < len(text) and (text[end].isdecimal() or text[end] == ","):
+            end += 1
+        digits = text[sign + 1:end].replace(",", "")
+        if digits:
+            return float(digits)
+        sign = text.find("$", end)
+    return None
+
+_EMPTY: Dict[str, Any] = {}
+
+def _amount(costs: Dict[str, Any], key: str) -> float:
+    """costs[key]["amount"], 0 when either level is missing"""
+    return costs.get(key, _EMPTY).get("amount", 0)
+
+# Search snippets within this relative distance of a baseline's tuition confirm it
+BASELINE_TOLERANCE = 0.2
+
+def _average_tuition(cost_analysis: Dict[str, Any]) -> float:
+    """Average yearly tuition of an analysis, 0 when missing or not numeric"""
+    average = cost_analysis.get("tuition_fees", _EMPTY).get("average_per_year")
+    return average if isinstance(average, (int, float)) else 0
+
+def _snippets_match_baseline(
+    tuition_results: List[Dict[str, Any]],
+    baseline: Dict[str, Any]
+) -> bool:
+    """True when the "$" amounts quoted in search snippets confirm the baseline"""
+    expected = _average_tuition(baseline)
+    if expected <= 0:
+        return False
+    
+    amounts = sorted(
+        amount for amount in (
+            _extract_dollar_amount(result.get("snippet", "").lower())
+            for result in tuition_results
+        )
+        if amount
+    )
+    if not amounts:
+        return False  # nothing to confirm the baseline
+    
+    median = amounts[len(amounts) // 2]
+    return abs(median - expected) <= expected * BASELINE_TOLERANCE
+
+# Number of top-ranked scholarships costed individually
+SAVINGS_SCENARIO_LIMIT = 5
+
+# Combination size -> discount applied to the weakest match score
+COMBINATION_PROBABILITY_FACTORS = ((2, 0.7), (3, 0.5))
+
+def combine_top_scholarships(
+    savings: List[float],
+    match_scores: List[float],
+    total_cost: float
+) -> List[Tuple[int, float, float]]:
+    """
+    Savings and success probability of stacking the top-k scholarships
+    (thuần số học; input đã sắp xếp theo độ ưu tiên)
+    
+    Returns:
+        [(k, capped_total_savings, success_probability), ...]
+    """
+    results = []
+    running_savings = 0
+    weakest_score = float("inf")
+    sizes = iter(COMBINATION_PROBABILITY_FACTORS)
+    size, factor = next(sizes)
+    
+    for count, (saving, score) in enumerate(zip(savings, match_scores), 1):
+        running_savings += saving
+        weakest_score = min(weakest_score, score)
+        if count == size:
+            results.append((size, min(running_savings, total_cost), weakest_score * factor))
+            size, factor = next(sizes, (None, None))
+            if size is None:
+                break
+    
+    return results
+
 class FinancialCalculatorAgent:
     """Agent tính toán tài chính du học chuyên nghiệp"""
     
@@ -20,12 +210,21 @@ class FinancialCalculatorAgent:
         self.llm = llm_manager
         self.currency_tool = currency_converter
         self.search_tool = web_search_tool
+        self.cache = session_manager
+        self.cost_cache_ttl = 6 * 60 * 60  # 6 hours - tuition/living costs change slowly
+        self._cost_research_inflight: Dict[str, asyncio.Future] = {}
+        # cache key -> on_token callbacks of the callers sharing an in-flight research
+        self._cost_research_subscribers: Dict[str, List[Callable[[str], Awaitable[None]]]] = {}
+        self.baseline_ttl = 7 * 24 * 60 * 60  # 7 days - per country/field/degree cost baseline
+        self.baseline_hits = 0
+        self.baseline_misses = 0
         
     async def calculate_study_costs(
         self,
         student_info: Dict[str, Any],
         scholarships: List[Dict[str, Any]],
-        target_currency: str = "VND"
+        target_currency: str = "VND",
+        stream_callback: Optional[Callable[[str, str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """
         Tính toán toàn diện chi phí du học
@@ -34,21 +233,41 @@ class FinancialCalculatorAgent:
             student_info: Thông tin học sinh (quốc gia, ngành học, etc.)
             scholarships: Danh sách học bổng được đề xuất
             target_currency: Tiền tệ hiển thị (mặc định VND)
+            stream_callback: Callback async (section, token) nhận token LLM khi đang stream
             
         Returns:
-            Phân tích tài chính chi tiết
+            Phân tích tài chính chi tiết (partial=True khi nghiên cứu chi phí hoặc
+            gợi ý tài chính bị lỗi và kết quả chỉ gồm phần tính được)
         """
         logger.info("Starting comprehensive financial calculation")
         
+        # Get study destination info
+        country = student_info.get("target_country", "")
+        field = student_info.get("field_of_study", "")
+        degree_level = student_info.get("degree_level", "")
+        partial = False
+        
+        # Research current costs; meanwhile warm the currency cache with the most
+        # common base currency so the later conversion is usually a cache hit
+        try:
+            research = self._research_study_costs(
+                country, field, degree_level,
+                on_token=bind_stream_section(stream_callback, "cost_analysis")
+            )
+            if target_currency.upper() != DEFAULT_BASE_CURRENCY:
+                cost_data, _ = await asyncio.gather(
+                    research,
+                    self.currency_tool.get_exchange_rate(DEFAULT_BASE_CURRENCY, target_currency)
+                )
+            else:
+                cost_data = await research
+        except Exception as e:
+            logger.warning("Cost research failed, continuing without cost data: {}", e)
+            cost_data = {"tuition_analysis": {}, "sources": []}
+            partial = True
+        
+        # Cost figures come from LLM output; malformed values must not crash the caller
         try:
-            # Get study destination info
-            country = student_info.get("target_country", "")
-            field = student_info.get("field_of_study", "")
-            degree_level = student_info.get("degree_level", "")
-            
-            # Research current costs
-            cost_data = await self._research_study_costs(country, field, degree_level)
-            
             # Calculate base costs
             base_costs = await self._calculate_base_costs(cost_data, country)
             
@@ -57,69 +276,161 @@ class FinancialCalculatorAgent:
                 scholarships, base_costs
             )
             
-            # Convert to target currency
+            # Convert to target currency (falls back to the base currency without a rate)
             financial_summary = await self._convert_to_target_currency(
                 base_costs, scholarship_analysis, target_currency
             )
-            
-            # Generate financial recommendations
-            recommendations = await self._generate_financial_recommendations(
-                financial_summary, student_info
-            )
-            
-            return {
-                "success": True,
-                "base_costs": base_costs,
-                "scholarship_analysis": scholarship_analysis,
-                "financial_summary": financial_summary,
-                "recommendations": recommendations,
-                "calculation_metadata": {
-                    "currency": target_currency,
-                    "calculation_date": asyncio.get_event_loop().time(),
-                    "data_sources": cost_data.get("sources", [])
-                }
-            }
-            
-        except Exception as e:
-            logger.error(f"Error in financial calculation: {str(e)}")
+        except (TypeError, ValueError, AttributeError, KeyError, ArithmeticError) as e:
+            logger.error("Error in financial calculation: {}", e)
             return {
                 "success": False,
                 "error": str(e),
                 "financial_summary": {}
             }
+        
+        # Generate financial recommendations
+        try:
+            recommendations = await self._generate_financial_recommendations(
+                financial_summary, student_info,
+                on_token=bind_stream_section(stream_callback, "financial_recommendations")
+            )
+        except Exception as e:
+            logger.warning("Financial recommendations failed: {}", e)
+            recommendations = {}
+            partial = True
+        
+        return {
+            "success": True,
+            "partial": partial,
+            "base_costs": base_costs,
+            "scholarship_analysis": scholarship_analysis,
+            "financial_summary": financial_summary,
+            "recommendations": recommendations,
+            "calculation_metadata": {
+                "currency": target_currency,
+                "calculation_date": time.time(),
+                "data_sources": cost_data.get("sources", [])
+            }
+        }
     
     async def _research_study_costs(
         self,
         country: str,
         field: str,
-        degree_level: str
+        degree_level: str,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
-        """Nghiên cứu chi phí du học hiện tại"""
-        
-        # Search for tuition fees
-        tuition_results = await self.search_tool.search_tuition_fees(
-            university="top universities",
-            country=country,
-            program=f"{field} {degree_level}"
-        )
+        """Nghiên cứu chi phí du học hiện tại (cache theo quốc gia/ngành/bậc học)"""
+        
+        cache_key = self._cost_cache_key(country, field, degree_level)
+        cached = await self.cache.get_cached(cache_key)
+        if cached is not None:
+            logger.info("Using cached study costs for: {} / {} / {}", country, field, degree_level)
+            return cached
+        
+        # Concurrent identical requests (possibly from different sessions) share one
+        # research run; its tokens fan out to every caller still waiting on it
+        subscribers = self._cost_research_subscribers.setdefault(cache_key, [])
+        task = self._cost_research_inflight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_study_costs(
+                cache_key, country, field, degree_level,
+                on_token=self._fan_out_tokens(subscribers)
+            ))
+            self._cost_research_inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._cost_research_inflight.pop(cache_key, None))
+            task.add_done_callback(lambda _: self._cost_research_subscribers.pop(cache_key, None))
+        
+        if on_token is not None:
+            subscribers.append(on_token)
+        try:
+            # Shield so one cancelled caller does not cancel the shared research
+            return await asyncio.shield(task)
+        finally:
+            if on_token in subscribers:
+                subscribers.remove(on_token)
+    
+    @staticmethod
+    def _fan_out_tokens(
+        subscribers: List[Callable[[str], Awaitable[None]]]
+    ) -> Callable[[str], Awaitable[None]]:
+        """on_token that forwards each token to the current subscribers"""
+        async def on_token(token: str):
+            for subscriber in list(subscribers):
+                try:
+                    await subscriber(token)
+                except Exception as e:
+                    # A closed UI must not abort the research the others wait on
+                    logger.warning("Dropping cost stream subscriber: {}", e)
+                    if subscriber in subscribers:
+                        subscribers.remove(subscriber)
+        return on_token
+    
+    def _cost_cache_key(self, country: str, field: str, degree_level: str) -> str:
+        """Cache key for researched study costs"""
+        parts = (country, field, degree_level)
+        return "costs:v1:" + "|".join(part.lower().strip() for part in parts)
+    
+    async def _fetch_study_costs(
+        self,
+        cache_key: str,
+        country: str,
+        field: str,
+        degree_level: str,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """Tìm kiếm + phân tích chi phí và lưu kết quả vào cache"""
         
-        # Search for living costs
+        # Search for tuition fees and living costs concurrently
         living_cost_query = f"{country} cost of living international students 2024"
-        living_results = await self.search_tool.search_scholarships(
-            query=living_cost_query,
-            country=country,
-            num_results=5
+        tuition_results, living_results = await asyncio.gather(
+            self.search_tool.search_tuition_fees(
+                university="top universities",
+                country=country,
+                program=f"{field} {degree_level}"
+            ),
+            self.search_tool.search_scholarships(
+                query=living_cost_query,
+                country=country,
+                num_results=5
+            )
         )
         
-        # Analyze cost data with LLM
-        cost_analysis = await self._analyze_cost_data(
-            tuition_results, living_results, country, field, degree_level
+        # A recent analysis for the same country/field/degree is reused (no LLM call)
+        # as long as the fresh search snippets confirm its tuition figure
+        baseline_key = self._baseline_cache_key(country, field, degree_level)
+        baseline = await self.cache.get_cached(baseline_key)
+        if baseline is not None and _snippets_match_baseline(tuition_results, baseline):
+            self.baseline_hits += 1
+            cost_analysis = baseline
+        else:
+            self.baseline_misses += 1
+            # Analyze cost data with LLM
+            cost_analysis = await self._analyze_cost_data(
+                tuition_results, living_results, country, field, degree_level, on_token
+            )
+        logger.info(
+            "Cost baseline hit rate: {}/{}",
+            self.baseline_hits, self.baseline_hits + self.baseline_misses
         )
         
-        return {
+        cost_data = {
             "tuition_analysis": cost_analysis,
             "sources": [r.get("link", "") for r in tuition_results + living_results]
         }
+        
+        # Don't pin the default (failed-parse) analysis, which has no usable tuition figure
+        if _average_tuition(cost_analysis) > 0:
+            await self.cache.set_cached(cache_key, cost_data, self.cost_cache_ttl)
+            if cost_analysis is not baseline:
+                await self.cache.set_cached(baseline_key, cost_analysis, self.baseline_ttl)
+        
+        return cost_data
+    
+    def _baseline_cache_key(self, country: str, field: str, degree_level: str) -> str:
+        """Cache key for the per country/field/degree cost baseline"""
+        parts = (country, field, degree_level)
+        return "costs:baseline:v2:" + "|".join(part.lower().strip() for part in parts)
     
     async def _analyze_cost_data(
         self,
@@ -127,7 +438,8 @@ class FinancialCalculatorAgent:
         living_results: List[Dict[str, Any]],
         country: str,
         field: str,
-        degree_level: str
+        degree_level: str,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """Phân tích dữ liệu chi phí với LLM"""
         
@@ -140,13 +452,6 @@ class FinancialCalculatorAgent:
         for result in living_results:
             search_content += f"- {result.get('title', '')}: {result.get('snippet', '')}\n"
         
-        system_prompt = f"""
-        {FINANCIAL_CALCULATOR_PROMPT}
-        
-        Phân tích thông tin chi phí du học và đưa ra ước tính chi tiết.
-        Tập trung vào chi phí cho sinh viên quốc tế từ Việt Nam.
-        """
-        
         messages = [
             {
                 "role": "user",
@@ -165,35 +470,9 @@ class FinancialCalculatorAgent:
         
         response = await self.llm.get_structured_response(
             messages=messages,
-            system_prompt=system_prompt,
-            schema={
-                "tuition_fees": {
-                    "min_per_year": "number",
-                    "max_per_year": "number",
-                    "average_per_year": "number",
-                    "currency": "string",
-                    "program_duration": "number (years)"
-                },
-                "living_costs": {
-                    "accommodation": {"min": "number", "max": "number", "currency": "string"},
-                    "food": {"min": "number", "max": "number", "currency": "string"},
-                    "transportation": {"min": "number", "max": "number", "currency": "string"},
-                    "personal_expenses": {"min": "number", "max": "number", "currency": "string"},
-                    "total_per_year": {"min": "number", "max": "number", "currency": "string"}
-                },
-                "other_costs": {
-                    "visa_fees": {"amount": "number", "currency": "string"},
-                    "health_insurance": {"amount": "number", "currency": "string"},
-                    "flights": {"amount": "number", "currency": "string"},
-                    "books_supplies": {"amount": "number", "currency": "string"}
-                },
-                "total_estimated_cost": {
-                    "min_total": "number",
-                    "max_total": "number",
-                    "realistic_estimate": "number",
-                    "currency": "string"
-                }
-            }
+            system_prompt=COST_ANALYSIS_SYSTEM_PROMPT,
+            on_token=on_token,
+            schema=COST_ANALYSIS_SCHEMA
         )
         
         return response
@@ -213,39 +492,43 @@ class FinancialCalculatorAgent:
         other = tuition_analysis.get("other_costs", {})
         
         # Calculate yearly costs
+        currency = tuition.get("currency", DEFAULT_BASE_CURRENCY)
         yearly_costs = {
             "tuition": tuition.get("average_per_year", 0),
-            "living": living.get("total_per_year", {}).get("max", 0),
-            "other": sum([
-                other.get("health_insurance", {}).get("amount", 0),
-                other.get("books_supplies", {}).get("amount", 0)
-            ]),
-            "currency": tuition.get("currency", "USD")
+            "living": living.get("total_per_year", _EMPTY).get("max", 0),
+            "other": _amount(other, "health_insurance") + _amount(other, "books_supplies"),
+            "currency": currency
         }
         
         # Calculate one-time costs
         one_time_costs = {
-            "visa": other.get("visa_fees", {}).get("amount", 0),
-            "flights": other.get("flights", {}).get("amount", 0),
-            "currency": tuition.get("currency", "USD")
+            "visa": _amount(other, "visa_fees"),
+            "flights": _amount(other, "flights"),
+            "currency": currency
         }
+        one_time_total = one_time_costs["visa"] + one_time_costs["flights"]
         
         # Calculate total program cost
         duration = tuition.get("program_duration", 4)
-        total_program_cost = (
-            yearly_costs["tuition"] + yearly_costs["living"] + yearly_costs["other"]
-        ) * duration + one_time_costs["visa"] + one_time_costs["flights"]
+        tuition_total = yearly_costs["tuition"] * duration
+        living_total = yearly_costs["living"] * duration
+        other_total = yearly_costs["other"] * duration + one_time_total
+        total_program_cost = tuition_total + living_total + other_total
+        
+        # Empty cost data (LLM fallback) gives a zero total - report a zero breakdown
+        # instead of failing the whole calculation on ZeroDivisionError
+        percent_per_unit = 100 / total_program_cost if total_program_cost > 0 else 0
         
         return {
             "yearly_costs": yearly_costs,
             "one_time_costs": one_time_costs,
             "program_duration": duration,
             "total_program_cost": total_program_cost,
-            "base_currency": yearly_costs["currency"],
+            "base_currency": currency,
             "cost_breakdown": {
-                "tuition_percentage": round((yearly_costs["tuition"] * duration / total_program_cost) * 100, 1),
-                "living_percentage": round((yearly_costs["living"] * duration / total_program_cost) * 100, 1),
-                "other_percentage": round(((yearly_costs["other"] * duration + sum(one_time_costs.values())) / total_program_cost) * 100, 1)
+                "tuition_percentage": round(tuition_total * percent_per_unit, 1),
+                "living_percentage": round(living_total * percent_per_unit, 1),
+                "other_percentage": round(other_total * percent_per_unit, 1)
             }
         }
     
@@ -261,29 +544,34 @@ class FinancialCalculatorAgent:
         yearly_tuition = base_costs.get("yearly_costs", {}).get("tuition", 0)
         duration = base_costs.get("program_duration", 4)
         
-        for scholarship in scholarships[:5]:  # Top 5 scholarships
+        percent_per_unit = 100 / total_program_cost if total_program_cost > 0 else 0
+        best_scenario = None
+        
+        for scholarship in scholarships[:SAVINGS_SCENARIO_LIMIT]:
             # Parse scholarship value
-            value_info = await self._parse_scholarship_value(
+            value_info = self._parse_scholarship_value(
                 scholarship, yearly_tuition, duration
             )
+            total_amount = value_info.get("total_amount", 0)
             
             # Calculate savings
             scenario = {
                 "scholarship_name": scholarship.get("name", ""),
                 "value_info": value_info,
-                "total_savings": value_info.get("total_amount", 0),
-                "net_cost": total_program_cost - value_info.get("total_amount", 0),
-                "savings_percentage": round((value_info.get("total_amount", 0) / total_program_cost) * 100, 1) if total_program_cost > 0 else 0,
+                "total_savings": total_amount,
+                "net_cost": total_program_cost - total_amount,
+                "savings_percentage": round(total_amount * percent_per_unit, 1) if percent_per_unit else 0,
                 "match_score": scholarship.get("final_match_score", 0)
             }
             
             scholarship_scenarios.append(scenario)
-        
-        # Find best scenario
-        best_scenario = max(scholarship_scenarios, key=lambda x: x["total_savings"]) if scholarship_scenarios else None
+            
+            # Track best scenario (first one wins ties, like max())
+            if best_scenario is None or total_amount > best_scenario["total_savings"]:
+                best_scenario = scenario
         
         # Calculate combined scenarios
-        combined_savings = await self._calculate_combined_scholarships(
+        combined_savings = self._calculate_combined_scholarships(
             scholarship_scenarios, total_program_cost
         )
         
@@ -294,7 +582,7 @@ class FinancialCalculatorAgent:
             "total_potential_savings": best_scenario.get("total_savings", 0) if best_scenario else 0
         }
     
-    async def _parse_scholarship_value(
+    def _parse_scholarship_value(
         self,
         scholarship: Dict[str, Any],
         yearly_tuition: float,
@@ -303,6 +591,7 @@ class FinancialCalculatorAgent:
         """Phân tích giá trị học bổng"""
         
         value_text = scholarship.get("value", "").lower()
+        keyword_tags = {match.lastgroup for match in VALUE_KEYWORD_PATTERN.finditer(value_text)}
         
         # Default values
         value_info = {
@@ -314,7 +603,7 @@ class FinancialCalculatorAgent:
         
         try:
             # Full scholarship
-            if any(keyword in value_text for keyword in ["full", "100%", "toàn phần"]):
+            if "full" in keyword_tags:
                 value_info.update({
                     "type": "full_tuition",
                     "annual_amount": yearly_tuition,
@@ -324,10 +613,9 @@ class FinancialCalculatorAgent:
             
             # Partial percentage
             elif "%" in value_text:
-                import re
-                percentage_match = re.search(r'(\d+)%', value_text)
-                if percentage_match:
-                    percentage = int(percentage_match.group(1)) / 100
+                percent = _extract_percent(value_text)
+                if percent is not None:
+                    percentage = percent / 100
                     value_info.update({
                         "type": "partial_percentage",
                         "annual_amount": yearly_tuition * percentage,
@@ -338,46 +626,41 @@ class FinancialCalculatorAgent:
             # Fixed amount
             else:
                 # Try to extract amount
-                import re
-                amount_patterns = [
-                    r'\$(\d+,?\d*)',
-                    r'(\d+,?\d*)\s*USD',
-                    r'(\d+,?\d*)\s*dollars'
-                ]
+                amount = _extract_dollar_amount(value_text) if "$" in value_text else None
+                if amount is None:
+                    for pattern in AMOUNT_PATTERNS:
+                        match = pattern.search(value_text)
+                        if match:
+                            amount = float(match.group(1).replace(',', ''))
+                            break
                 
-                for pattern in amount_patterns:
-                    match = re.search(pattern, value_text)
-                    if match:
-                        amount_str = match.group(1).replace(',', '')
-                        amount = float(amount_str)
-                        
-                        # Determine if per year or total
-                        if any(keyword in value_text for keyword in ["per year", "annually", "yearly"]):
-                            value_info.update({
-                                "type": "fixed_annual",
-                                "annual_amount": amount,
-                                "total_amount": amount * duration,
-                                "covers": ["tuition"]
-                            })
-                        else:
-                            value_info.update({
-                                "type": "fixed_total",
-                                "annual_amount": amount / duration,
-                                "total_amount": amount,
-                                "covers": ["tuition"]
-                            })
-                        break
+                if amount is not None:
+                    # Determine if per year or total
+                    if "annual" in keyword_tags:
+                        value_info.update({
+                            "type": "fixed_annual",
+                            "annual_amount": amount,
+                            "total_amount": amount * duration,
+                            "covers": ["tuition"]
+                        })
+                    else:
+                        value_info.update({
+                            "type": "fixed_total",
+                            "annual_amount": amount / duration,
+                            "total_amount": amount,
+                            "covers": ["tuition"]
+                        })
         
         except Exception as e:
             logger.warning(f"Error parsing scholarship value: {str(e)}")
         
         return value_info
     
-    async def _calculate_combined_scholarships(
+    def _calculate_combined_scholarships(
         self,
         scenarios: List[Dict[str, Any]],
         total_cost: float
-    ) -> Dict[str, Any]:
+    ) -> List[Dict[str, Any]]:
         """Tính toán kết hợp nhiều học bổng"""
         
         # Sort by match score and savings
@@ -389,33 +672,16 @@ class FinancialCalculatorAgent:
         
         # Simulate combinations (simplified)
         combinations = []
-        
-        if len(sorted_scenarios) >= 2:
-            # Top 2 combination
-            top_two_savings = min(
-                sorted_scenarios[0]["total_savings"] + sorted_scenarios[1]["total_savings"],
-                total_cost
-            )
-            
-            combinations.append({
-                "scholarships": [sorted_scenarios[0]["scholarship_name"], sorted_scenarios[1]["scholarship_name"]],
-                "total_savings": top_two_savings,
-                "net_cost": total_cost - top_two_savings,
-                "success_probability": min(sorted_scenarios[0]["match_score"], sorted_scenarios[1]["match_score"]) * 0.7
-            })
-        
-        if len(sorted_scenarios) >= 3:
-            # Top 3 combination
-            top_three_savings = min(
-                sum(s["total_savings"] for s in sorted_scenarios[:3]),
-                total_cost
-            )
-            
+        for size, savings, probability in combine_top_scholarships(
+            [s["total_savings"] for s in sorted_scenarios],
+            [s["match_score"] for s in sorted_scenarios],
+            total_cost
+        ):
             combinations.append({
-                "scholarships": [s["scholarship_name"] for s in sorted_scenarios[:3]],
-                "total_savings": top_three_savings,
-                "net_cost": total_cost - top_three_savings,
-                "success_probability": min(s["match_score"] for s in sorted_scenarios[:3]) * 0.5
+                "scholarships": [s["scholarship_name"] for s in sorted_scenarios[:size]],
+                "total_savings": savings,
+                "net_cost": total_cost - savings,
+                "success_probability": probability
             })
         
         return combinations
@@ -442,21 +708,22 @@ class FinancialCalculatorAgent:
             conversion_rate = 1.0
             target_currency = base_currency
         
-        # Convert base costs
-        converted_costs = {}
-        for cost_type, amount in base_costs.get("yearly_costs", {}).items():
-            if isinstance(amount, (int, float)):
-                converted_costs[cost_type] = round(amount * conversion_rate, 0)
+        # Convert base costs (whole currency units - VND has no minor unit)
+        converted_costs = {
+            cost_type: round(amount * conversion_rate)
+            for cost_type, amount in base_costs.get("yearly_costs", {}).items()
+            if isinstance(amount, (int, float))
+        }
         
         total_program_cost_converted = round(
-            base_costs.get("total_program_cost", 0) * conversion_rate, 0
+            base_costs.get("total_program_cost", 0) * conversion_rate
         )
         
         # Convert scholarship savings
         best_scholarship = scholarship_analysis.get("best_single_scholarship")
         if best_scholarship:
             best_savings_converted = round(
-                best_scholarship.get("total_savings", 0) * conversion_rate, 0
+                best_scholarship.get("total_savings", 0) * conversion_rate
             )
             net_cost_converted = total_program_cost_converted - best_savings_converted
         else:
@@ -482,7 +749,8 @@ class FinancialCalculatorAgent:
     async def _generate_financial_recommendations(
         self,
         financial_summary: Dict[str, Any],
-        student_info: Dict[str, Any]
+        student_info: Dict[str, Any],
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """Tạo gợi ý tài chính"""
         
@@ -490,18 +758,13 @@ class FinancialCalculatorAgent:
         net_cost = financial_summary.get("net_cost_after_scholarships", 0)
         currency = financial_summary.get("currency", "VND")
         
-        system_prompt = """
-        Đưa ra lời khuyên tài chính thực tế cho du học sinh Việt Nam.
-        Tập trung vào khả năng tài chính của gia đình Việt Nam và các nguồn tài trợ.
-        """
-        
         messages = [
             {
                 "role": "user",
                 "content": f"""
                 Tổng chi phí: {total_cost:,.0f} {currency}
                 Chi phí sau học bổng: {net_cost:,.0f} {currency}
-                Thông tin học sinh: {json.dumps(student_info, ensure_ascii=False)}
+                Thông tin học sinh: {dumps_json(student_info)}
                 
                 Hãy đưa ra gợi ý tài chính cụ thể và thực tế.
                 """
@@ -510,39 +773,9 @@ class FinancialCalculatorAgent:
         
         response = await self.llm.get_structured_response(
             messages=messages,
-            system_prompt=system_prompt,
-            schema={
-                "affordability_assessment": "string (affordable/challenging/difficult)",
-                "funding_strategies": [
-                    {
-                        "strategy": "string",
-                        "description": "string",
-                        "potential_amount": "number",
-                        "timeline": "string",
-                        "difficulty": "string (easy/medium/hard)"
-                    }
-                ],
-                "savings_plan": {
-                    "monthly_savings_needed": "number",
-                    "savings_duration": "string",
-                    "total_family_contribution": "number"
-                },
-                "alternative_options": [
-                    {
-                        "option": "string",
-                        "description": "string",
-                        "cost_reduction": "number"
-                    }
-                ],
-                "financial_timeline": [
-                    {
-                        "phase": "string",
-                        "timeframe": "string",
-                        "actions": ["list of actions"],
-                        "target_amount": "number"
-                    }
-                ]
-            }
+            system_prompt=RECOMMENDATIONS_SYSTEM_PROMPT,
+            on_token=on_token,
+            schema=RECOMMENDATIONS_SCHEMA
         )
         
         return response
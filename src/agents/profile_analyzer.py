@@ -3,26 +3,215 @@ Profile Analyzer Agent - Agent phân tích hồ sơ học sinh
 Nhiệm vụ: Phân tích hồ sơ học tập, đánh giá điểm mạnh/yếu, so sánh với yêu cầu học bổng
 """
 import asyncio
-import json
-from typing import Dict, List, Any, Optional
+import copy
+import hashlib
+from bisect import bisect_right
+from itertools import chain, islice
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Callable, Awaitable
 from loguru import logger
 
-from ..utils.llm_client import llm_manager
+from ..utils.llm_client import llm_manager, bind_stream_section
+from ..utils.json_utils import dumps_json
+from ..utils.session_manager import session_manager
 from ..config.prompts import PROFILE_ANALYZER_PROMPT, VIETNAMESE_STUDENT_CONTEXT
 from ..tools.file_processor import file_processor
 
+ACADEMIC_ANALYSIS_SCHEMA = {
+    "gpa_analysis": {
+        "score": "number or null",
+        "scale": "string (10-point or 4-point)",
+        "strength": "string (excellent/good/average/needs_improvement)",
+        "percentile": "string"
+    },
+    "test_score_analysis": {
+        "ielts": {"score": "number or null", "target": "number", "gap": "number"},
+        "toefl": {"score": "number or null", "target": "number", "gap": "number"},
+        "sat": {"score": "number or null", "target": "number", "gap": "number"},
+        "other_tests": "object"
+    },
+    "academic_strengths": ["list of strengths"],
+    "academic_weaknesses": ["list of weaknesses"],
+    "competitiveness_level": "string (high/medium/low)",
+    "improvement_priority": "string (gpa/test_scores/achievements)"
+}
+
+ACADEMIC_SYSTEM_PROMPT = f"""
+{PROFILE_ANALYZER_PROMPT}
+
+{VIETNAMESE_STUDENT_CONTEXT}
+
+Phân tích thành tích học tập của học sinh Việt Nam.
+Lưu ý về hệ thống giáo dục Việt Nam: thang điểm 10 hoặc 4.
+"""
+
+EXTRACURRICULAR_ANALYSIS_SCHEMA = {
+    "activity_diversity": {
+        "score": "number 0-100",
+        "categories": ["list of activity categories"],
+        "strength": "string"
+    },
+    "leadership_experience": {
+        "score": "number 0-100",
+        "examples": ["list of leadership examples"],
+        "level": "string (high/medium/low/none)"
+    },
+    "community_impact": {
+        "score": "number 0-100",
+        "examples": ["list of impact examples"],
+        "significance": "string"
+    },
+    "skill_assessment": {
+        "technical_skills": ["list"],
+        "soft_skills": ["list"],
+        "language_skills": ["list"],
+        "marketability": "string"
+    },
+    "extracurricular_strengths": ["list of strengths"],
+    "extracurricular_gaps": ["list of gaps"],
+    "activity_recommendations": ["list of recommended activities"]
+}
+
+EXTRACURRICULAR_SYSTEM_PROMPT = """
+Phân tích hoạt động ngoại khóa và kỹ năng của học sinh.
+Đánh giá mức độ đa dạng, leadership, và impact.
+"""
+
+COMPETITIVENESS_ANALYSIS_SCHEMA = {
+    "scholarship_matches": [
+        {
+            "scholarship_name": "string",
+            "match_percentage": "number 0-100",
+            "meets_requirements": "boolean",
+            "missing_requirements": ["list"],
+            "competitive_advantage": ["list"],
+            "success_probability": "string (high/medium/low)"
+        }
+    ],
+    "overall_competitiveness": "string (excellent/good/average/weak)",
+    "strongest_areas": ["list"],
+    "weakest_areas": ["list"],
+    "immediate_improvements": ["list"],
+    "long_term_goals": ["list"]
+}
+
+COMPETITIVENESS_SYSTEM_PROMPT = """
+So sánh hồ sơ học sinh với yêu cầu của các học bổng.
+Đánh giá khả năng cạnh tranh và xác suất thành công.
+"""
+
+IMPROVEMENT_PLAN_SCHEMA = {
+    "immediate_actions": [
+        {
+            "action": "string",
+            "timeline": "string (1-3 months)",
+            "impact": "string (high/medium/low)",
+            "difficulty": "string (easy/medium/hard)",
+            "cost": "string (free/low/medium/high)"
+        }
+    ],
+    "short_term_goals": [
+        {
+            "goal": "string",
+            "timeline": "string (3-6 months)",
+            "steps": ["list of steps"],
+            "success_metrics": "string"
+        }
+    ],
+    "long_term_objectives": [
+        {
+            "objective": "string",
+            "timeline": "string (6-12 months)",
+            "preparation_needed": ["list"],
+            "expected_outcome": "string"
+        }
+    ],
+    "priority_matrix": {
+        "high_priority": ["list of high priority items"],
+        "medium_priority": ["list of medium priority items"],
+        "low_priority": ["list of low priority items"]
+    },
+    "resource_recommendations": {
+        "books": ["list of recommended books"],
+        "courses": ["list of recommended courses"],
+        "activities": ["list of recommended activities"],
+        "certifications": ["list of recommended certifications"]
+    }
+}
+
+IMPROVEMENT_SYSTEM_PROMPT = """
+Dựa trên phân tích hồ sơ, tạo ra các gợi ý cải thiện cụ thể và có thể thực hiện.
+Ưu tiên các hành động có impact cao và timeline thực tế.
+"""
+
+# List fields merged from every successfully processed upload
+PROFILE_LIST_FIELDS = ("achievements", "activities", "skills", "languages")
+
+# Prompt trimming: per-field item cap and max length of free-text entries
+PROMPT_ITEM_LIMIT = 10
+PROMPT_TEXT_LIMIT = 200
+# basic_info fields relevant to matching scholarship requirements
+COMPETITIVENESS_BASIC_FIELDS = ("target_country", "field_of_study", "degree_level")
+
+def _clip_items(items: List[Any]) -> List[Any]:
+    """First PROMPT_ITEM_LIMIT items, long text entries cut to PROMPT_TEXT_LIMIT chars"""
+    return [
+        item[:PROMPT_TEXT_LIMIT] if isinstance(item, str) else item
+        for item in islice(items, PROMPT_ITEM_LIMIT)
+    ]
+
+def _competitiveness_signature(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact view of the profile with only what scholarship matching needs"""
+    basic_info = profile.get("basic_info", {})
+    
+    return {
+        **{field: basic_info[field] for field in COMPETITIVENESS_BASIC_FIELDS if basic_info.get(field)},
+        "gpa": profile.get("academic_record", {}).get("gpa"),
+        "test_scores": profile.get("test_scores", {}),
+        "achievements": _clip_items(profile.get("achievements", [])),
+        "activities": _clip_items(profile.get("activities", [])),
+        "languages": profile.get("languages", []),
+        "profile_strength": profile.get("profile_strength", "Unknown")
+    }
+
+# Profile scoring tables. Threshold tuples are ascending; bisect_right picks the
+# label/points for the highest threshold reached (>=), index 0 is "below all"
+GPA_STRENGTH_POINTS = {"excellent": 30, "good": 20, "average": 10}
+IELTS_THRESHOLDS = (6.0, 6.5, 7.0)
+IELTS_POINTS = (0, 5, 10, 15)
+RATING_THRESHOLDS = (35, 50, 65, 80)
+RATING_LABELS = (
+    "Needs Significant Improvement", "Developing", "Competitive", "Strong", "Outstanding"
+)
+PERCENTILE_THRESHOLDS = (45, 55, 65, 75, 85)
+PERCENTILE_LABELS = ("Below 70%", "Top 70%", "Top 50%", "Top 30%", "Top 15%", "Top 5%")
+EXTRACURRICULAR_WEIGHTS = (
+    ("activity_diversity", 0.2),
+    ("leadership_experience", 0.15),
+    ("community_impact", 0.15)
+)
+
+# Exact-match cache of structured LLM responses; repeated consultations with the
+# same profile (e.g. re-running after a UI edit) skip the LLM round-trip.
+# In-process LRU in front of the shared session_manager cache
+RESPONSE_CACHE_SIZE = 1024
+
 class ProfileAnalyzerAgent:
     """Agent phân tích hồ sơ học tập chuyên nghiệp"""
     
     def __init__(self):
         self.name = "ProfileAnalyzerAgent"
         self.llm = llm_manager
+        self._response_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.cache = session_manager  # shared across workers when USE_REDIS
+        self.response_cache_ttl = 24 * 3600
         
     async def analyze_student_profile(
         self,
         student_info: Dict[str, Any],
         file_analysis: Optional[Dict[str, Any]] = None,
-        scholarship_requirements: Optional[List[Dict[str, Any]]] = None
+        scholarship_requirements: Optional[List[Dict[str, Any]]] = None,
+        stream_callback: Optional[Callable[[str, str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """
         Phân tích toàn diện hồ sơ học sinh
@@ -31,6 +220,7 @@ class ProfileAnalyzerAgent:
             student_info: Thông tin cơ bản của học sinh
             file_analysis: Kết quả phân tích file upload
             scholarship_requirements: Yêu cầu của các học bổng
+            stream_callback: Callback async (section, token) nhận token LLM khi đang stream
             
         Returns:
             Phân tích hồ sơ chi tiết với điểm mạnh/yếu và gợi ý cải thiện
@@ -39,28 +229,38 @@ class ProfileAnalyzerAgent:
         
         try:
             # Combine all available information
-            combined_profile = await self._combine_profile_data(
+            combined_profile = self._combine_profile_data(
                 student_info, file_analysis
             )
             
-            # Analyze academic performance
-            academic_analysis = await self._analyze_academic_performance(
-                combined_profile
-            )
-            
-            # Analyze extracurricular activities
-            extracurricular_analysis = await self._analyze_extracurricular_activities(
-                combined_profile
-            )
-            
-            # Analyze competitiveness
-            competitiveness_analysis = await self._analyze_competitiveness(
-                combined_profile, scholarship_requirements
+            # Academic, extracurricular and competitiveness analyses are
+            # independent LLM calls - run them concurrently
+            (
+                academic_analysis,
+                extracurricular_analysis,
+                competitiveness_analysis
+            ) = await asyncio.gather(
+                self._analyze_academic_performance(
+                    combined_profile,
+                    on_token=bind_stream_section(stream_callback, "academic_analysis")
+                ),
+                self._analyze_extracurricular_activities(
+                    combined_profile,
+                    on_token=bind_stream_section(stream_callback, "extracurricular_analysis")
+                ),
+                self._analyze_competitiveness(
+                    combined_profile,
+                    scholarship_requirements,
+                    on_token=bind_stream_section(stream_callback, "competitiveness_analysis")
+                )
             )
             
             # Generate improvement recommendations
             improvement_recommendations = await self._generate_improvement_recommendations(
-                academic_analysis, extracurricular_analysis, competitiveness_analysis
+                academic_analysis,
+                extracurricular_analysis,
+                competitiveness_analysis,
+                on_token=bind_stream_section(stream_callback, "profile_recommendations")
             )
             
             # Calculate overall profile score
@@ -89,7 +289,34 @@ class ProfileAnalyzerAgent:
                 "profile_data": {}
             }
     
-    async def _combine_profile_data(
+    async def analyze_student_profiles(
+        self,
+        students: List[Dict[str, Any]],
+        scholarship_requirements: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Phân tích nhiều hồ sơ cùng lúc (ví dụ: cả danh sách học sinh của một trường)
+        
+        Các hồ sơ chạy song song; số request LLM đồng thời vẫn bị giới hạn bởi
+        semaphore toàn cục của LLM client (settings.LLM_CONCURRENCY).
+        
+        Args:
+            students: Danh sách thông tin cơ bản của từng học sinh
+            scholarship_requirements: Yêu cầu học bổng dùng chung cho mọi hồ sơ
+            
+        Returns:
+            Kết quả phân tích theo đúng thứ tự của students
+        """
+        logger.info("Analyzing {} student profiles", len(students))
+        
+        return await asyncio.gather(*(
+            self.analyze_student_profile(
+                student_info, scholarship_requirements=scholarship_requirements
+            )
+            for student_info in students
+        ))
+    
+    def _combine_profile_data(
         self,
         student_info: Dict[str, Any],
         file_analysis: Optional[Dict[str, Any]]
@@ -110,56 +337,121 @@ class ProfileAnalyzerAgent:
         
         # Extract information from file analysis if available
         if file_analysis and file_analysis.get("successful_files", 0) > 0:
-            for result in file_analysis.get("results", []):
-                if result.get("success"):
-                    profile_data = result.get("profile", {})
-                    
-                    # Merge academic data
-                    if "gpa" in profile_data:
-                        combined_profile["academic_record"]["gpa"] = profile_data["gpa"]
-                    
-                    # Merge test scores
-                    combined_profile["test_scores"].update(
-                        profile_data.get("test_scores", {})
-                    )
-                    
-                    # Merge activities and achievements
-                    combined_profile["achievements"].extend(
-                        profile_data.get("achievements", [])
-                    )
-                    combined_profile["activities"].extend(
-                        profile_data.get("activities", [])
-                    )
-                    combined_profile["skills"].extend(
-                        profile_data.get("skills", [])
-                    )
-                    combined_profile["languages"].extend(
-                        profile_data.get("languages", [])
-                    )
-                    
-                    # Add profile score if available
-                    if "score" in result:
-                        combined_profile["profile_strength"] = result["score"].get("strength_level", "Unknown")
+            successful_results = [
+                result for result in file_analysis.get("results", [])
+                if result.get("success")
+            ]
+            profiles = [result.get("profile", {}) for result in successful_results]
+            
+            # Merge academic data (later files win)
+            for profile_data in profiles:
+                if "gpa" in profile_data:
+                    combined_profile["academic_record"]["gpa"] = profile_data["gpa"]
+            
+            # Merge test scores
+            combined_profile["test_scores"] = dict(chain.from_iterable(
+                profile_data.get("test_scores", {}).items() for profile_data in profiles
+            ))
+            
+            # Merge activities and achievements - one list build per field
+            for field in PROFILE_LIST_FIELDS:
+                combined_profile[field] = list(chain.from_iterable(
+                    profile_data.get(field, []) for profile_data in profiles
+                ))
+            
+            # Add profile score if available (from the last scored file)
+            for result in successful_results:
+                if "score" in result:
+                    combined_profile["profile_strength"] = result["score"].get("strength_level", "Unknown")
         
         return combined_profile
     
+    @staticmethod
+    def _response_cache_key(
+        messages: List[Dict[str, str]],
+        system_prompt: str,
+        schema: Dict[str, Any]
+    ) -> str:
+        """Stable digest of a structured request (prompt, messages, schema)"""
+        canonical = dumps_json([system_prompt, messages, schema], sort_keys=True)
+        digest = hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+        return f"profile:v1:{digest}"
+    
+    async def _cached_structured_response(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: str,
+        schema: Dict[str, Any],
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """
+        get_structured_response với cache theo nội dung request (cache hit không stream):
+        LRU trong process, sau đó cache dùng chung (Redis khi bật USE_REDIS)
+        """
+        
+        cache_key = self._response_cache_key(messages, system_prompt, schema)
+        cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            self._response_cache.move_to_end(cache_key)
+            logger.info("Using cached profile analysis response")
+            return copy.deepcopy(cached)
+        
+        # Without Redis the shared cache is just another local dict - skip it
+        cached = await self.cache.get_cached(cache_key) if self.cache.use_redis else None
+        if cached is not None:
+            logger.info("Using shared cached profile analysis response")
+            self._remember_response(cache_key, cached)
+            return copy.deepcopy(cached)
+        
+        response = await self.llm.get_structured_response(
+            messages=messages,
+            system_prompt=system_prompt,
+            schema=schema,
+            on_token=on_token
+        )
+        
+        # Default response (LLM/parse failure) - don't pin it in cache
+        if response and not self.llm.is_default_response(response):
+            self._remember_response(cache_key, response)
+            if self.cache.use_redis:
+                await self.cache.set_cached(cache_key, response, self.response_cache_ttl)
+            # The LRU keeps the original; callers get their own nested dicts
+            return copy.deepcopy(response)
+        
+        return response
+    
+    def _remember_response(self, cache_key: str, response: Dict[str, Any]):
+        """Store a response in the in-process LRU"""
+        self._response_cache[cache_key] = response
+        if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+    
     async def _analyze_academic_performance(
         self,
-        profile: Dict[str, Any]
+        profile: Dict[str, Any],
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """Phân tích thành tích học tập"""
         
         academic_data = profile.get("academic_record", {})
         test_scores = profile.get("test_scores", {})
+        achievements = profile.get("achievements", [])
         
-        system_prompt = f"""
-        {PROFILE_ANALYZER_PROMPT}
-        
-        {VIETNAMESE_STUDENT_CONTEXT}
-        
-        Phân tích thành tích học tập của học sinh Việt Nam.
-        Lưu ý về hệ thống giáo dục Việt Nam: thang điểm 10 hoặc 4.
-        """
+        # Nothing to analyze - skip the LLM round-trip
+        if not academic_data.get("gpa") and not test_scores and not achievements:
+            return {
+                "gpa_analysis": {
+                    "score": None,
+                    "scale": "Chưa có",
+                    "strength": "needs_improvement",
+                    "percentile": "Chưa xác định"
+                },
+                "test_score_analysis": {},
+                "academic_strengths": [],
+                "academic_weaknesses": ["Chưa có thông tin GPA hoặc điểm thi"],
+                "competitiveness_level": "low",
+                "improvement_priority": "gpa"
+            }
         
         messages = [
             {
@@ -167,42 +459,27 @@ class ProfileAnalyzerAgent:
                 "content": f"""
                 Thông tin học tập:
                 - GPA: {academic_data.get('gpa', 'Chưa có')}
-                - Điểm thi: {json.dumps(test_scores, ensure_ascii=False)}
-                - Thành tích: {json.dumps(profile.get('achievements', []), ensure_ascii=False)}
+                - Điểm thi: {dumps_json(test_scores)}
+                - Thành tích: {dumps_json(achievements)}
                 
                 Hãy phân tích thành tích học tập và đánh giá điểm mạnh/yếu.
                 """
             }
         ]
         
-        response = await self.llm.get_structured_response(
+        response = await self._cached_structured_response(
             messages=messages,
-            system_prompt=system_prompt,
-            schema={
-                "gpa_analysis": {
-                    "score": "number or null",
-                    "scale": "string (10-point or 4-point)",
-                    "strength": "string (excellent/good/average/needs_improvement)",
-                    "percentile": "string"
-                },
-                "test_score_analysis": {
-                    "ielts": {"score": "number or null", "target": "number", "gap": "number"},
-                    "toefl": {"score": "number or null", "target": "number", "gap": "number"},
-                    "sat": {"score": "number or null", "target": "number", "gap": "number"},
-                    "other_tests": "object"
-                },
-                "academic_strengths": ["list of strengths"],
-                "academic_weaknesses": ["list of weaknesses"],
-                "competitiveness_level": "string (high/medium/low)",
-                "improvement_priority": "string (gpa/test_scores/achievements)"
-            }
+            system_prompt=ACADEMIC_SYSTEM_PROMPT,
+            schema=ACADEMIC_ANALYSIS_SCHEMA,
+            on_token=on_token
         )
         
         return response
     
     async def _analyze_extracurricular_activities(
         self,
-        profile: Dict[str, Any]
+        profile: Dict[str, Any],
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """Phân tích hoạt động ngoại khóa"""
         
@@ -210,53 +487,41 @@ class ProfileAnalyzerAgent:
         skills = profile.get("skills", [])
         work_experience = profile.get("work_experience", [])
         
-        system_prompt = """
-        Phân tích hoạt động ngoại khóa và kỹ năng của học sinh.
-        Đánh giá mức độ đa dạng, leadership, và impact.
-        """
+        # Nothing to analyze - skip the LLM round-trip
+        if not activities and not skills and not work_experience:
+            return {
+                "activity_diversity": {"score": 0, "categories": [], "strength": "none"},
+                "leadership_experience": {"score": 0, "examples": [], "level": "none"},
+                "community_impact": {"score": 0, "examples": [], "significance": "none"},
+                "skill_assessment": {
+                    "technical_skills": [],
+                    "soft_skills": [],
+                    "language_skills": [],
+                    "marketability": "Chưa xác định"
+                },
+                "extracurricular_strengths": [],
+                "extracurricular_gaps": ["Chưa có thông tin hoạt động ngoại khóa"],
+                "activity_recommendations": []
+            }
         
         messages = [
             {
                 "role": "user",
                 "content": f"""
-                Hoạt động ngoại khóa: {json.dumps(activities, ensure_ascii=False)}
-                Kỹ năng: {json.dumps(skills, ensure_ascii=False)}
-                Kinh nghiệm làm việc: {json.dumps(work_experience, ensure_ascii=False)}
+                Hoạt động ngoại khóa: {dumps_json(_clip_items(activities))}
+                Kỹ năng: {dumps_json(_clip_items(skills))}
+                Kinh nghiệm làm việc: {dumps_json(_clip_items(work_experience))}
                 
                 Hãy phân tích và đánh giá hoạt động ngoại khóa.
                 """
             }
         ]
         
-        response = await self.llm.get_structured_response(
+        response = await self._cached_structured_response(
             messages=messages,
-            system_prompt=system_prompt,
-            schema={
-                "activity_diversity": {
-                    "score": "number 0-100",
-                    "categories": ["list of activity categories"],
-                    "strength": "string"
-                },
-                "leadership_experience": {
-                    "score": "number 0-100",
-                    "examples": ["list of leadership examples"],
-                    "level": "string (high/medium/low/none)"
-                },
-                "community_impact": {
-                    "score": "number 0-100",
-                    "examples": ["list of impact examples"],
-                    "significance": "string"
-                },
-                "skill_assessment": {
-                    "technical_skills": ["list"],
-                    "soft_skills": ["list"],
-                    "language_skills": ["list"],
-                    "marketability": "string"
-                },
-                "extracurricular_strengths": ["list of strengths"],
-                "extracurricular_gaps": ["list of gaps"],
-                "activity_recommendations": ["list of recommended activities"]
-            }
+            system_prompt=EXTRACURRICULAR_SYSTEM_PROMPT,
+            schema=EXTRACURRICULAR_ANALYSIS_SCHEMA,
+            on_token=on_token
         )
         
         return response
@@ -264,7 +529,8 @@ class ProfileAnalyzerAgent:
     async def _analyze_competitiveness(
         self,
         profile: Dict[str, Any],
-        scholarship_requirements: Optional[List[Dict[str, Any]]] = None
+        scholarship_requirements: Optional[List[Dict[str, Any]]] = None,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """Phân tích tính cạnh tranh so với yêu cầu học bổng"""
         
@@ -275,44 +541,24 @@ class ProfileAnalyzerAgent:
                 "improvement_needed": []
             }
         
-        system_prompt = """
-        So sánh hồ sơ học sinh với yêu cầu của các học bổng.
-        Đánh giá khả năng cạnh tranh và xác suất thành công.
-        """
-        
         messages = [
             {
                 "role": "user",
                 "content": f"""
-                Hồ sơ học sinh: {json.dumps(profile, ensure_ascii=False)}
+                Hồ sơ học sinh: {dumps_json(_competitiveness_signature(profile))}
                 
-                Yêu cầu học bổng: {json.dumps(scholarship_requirements, ensure_ascii=False)}
+                Yêu cầu học bổng: {dumps_json(scholarship_requirements)}
                 
                 Hãy so sánh và đánh giá tính cạnh tranh.
                 """
             }
         ]
         
-        response = await self.llm.get_structured_response(
+        response = await self._cached_structured_response(
             messages=messages,
-            system_prompt=system_prompt,
-            schema={
-                "scholarship_matches": [
-                    {
-                        "scholarship_name": "string",
-                        "match_percentage": "number 0-100",
-                        "meets_requirements": "boolean",
-                        "missing_requirements": ["list"],
-                        "competitive_advantage": ["list"],
-                        "success_probability": "string (high/medium/low)"
-                    }
-                ],
-                "overall_competitiveness": "string (excellent/good/average/weak)",
-                "strongest_areas": ["list"],
-                "weakest_areas": ["list"],
-                "immediate_improvements": ["list"],
-                "long_term_goals": ["list"]
-            }
+            system_prompt=COMPETITIVENESS_SYSTEM_PROMPT,
+            schema=COMPETITIVENESS_ANALYSIS_SCHEMA,
+            on_token=on_token
         )
         
         return response
@@ -321,69 +567,29 @@ class ProfileAnalyzerAgent:
         self,
         academic_analysis: Dict[str, Any],
         extracurricular_analysis: Dict[str, Any],
-        competitiveness_analysis: Dict[str, Any]
+        competitiveness_analysis: Dict[str, Any],
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """Tạo gợi ý cải thiện cụ thể"""
         
-        system_prompt = """
-        Dựa trên phân tích hồ sơ, tạo ra các gợi ý cải thiện cụ thể và có thể thực hiện.
-        Ưu tiên các hành động có impact cao và timeline thực tế.
-        """
-        
         messages = [
             {
                 "role": "user",
                 "content": f"""
-                Phân tích học tập: {json.dumps(academic_analysis, ensure_ascii=False)}
-                Phân tích ngoại khóa: {json.dumps(extracurricular_analysis, ensure_ascii=False)}
-                Phân tích cạnh tranh: {json.dumps(competitiveness_analysis, ensure_ascii=False)}
+                Phân tích học tập: {dumps_json(academic_analysis)}
+                Phân tích ngoại khóa: {dumps_json(extracurricular_analysis)}
+                Phân tích cạnh tranh: {dumps_json(competitiveness_analysis)}
                 
                 Tạo kế hoạch cải thiện hồ sơ cụ thể cho học sinh Việt Nam.
                 """
             }
         ]
         
-        response = await self.llm.get_structured_response(
+        response = await self._cached_structured_response(
             messages=messages,
-            system_prompt=system_prompt,
-            schema={
-                "immediate_actions": [
-                    {
-                        "action": "string",
-                        "timeline": "string (1-3 months)",
-                        "impact": "string (high/medium/low)",
-                        "difficulty": "string (easy/medium/hard)",
-                        "cost": "string (free/low/medium/high)"
-                    }
-                ],
-                "short_term_goals": [
-                    {
-                        "goal": "string",
-                        "timeline": "string (3-6 months)",
-                        "steps": ["list of steps"],
-                        "success_metrics": "string"
-                    }
-                ],
-                "long_term_objectives": [
-                    {
-                        "objective": "string",
-                        "timeline": "string (6-12 months)",
-                        "preparation_needed": ["list"],
-                        "expected_outcome": "string"
-                    }
-                ],
-                "priority_matrix": {
-                    "high_priority": ["list of high priority items"],
-                    "medium_priority": ["list of medium priority items"],
-                    "low_priority": ["list of low priority items"]
-                },
-                "resource_recommendations": {
-                    "books": ["list of recommended books"],
-                    "courses": ["list of recommended courses"],
-                    "activities": ["list of recommended activities"],
-                    "certifications": ["list of recommended certifications"]
-                }
-            }
+            system_prompt=IMPROVEMENT_SYSTEM_PROMPT,
+            schema=IMPROVEMENT_PLAN_SCHEMA,
+            on_token=on_token
         )
         
         return response
@@ -399,49 +605,26 @@ class ProfileAnalyzerAgent:
         academic_score = 0
         if "gpa_analysis" in academic_analysis:
             gpa_strength = academic_analysis["gpa_analysis"].get("strength", "average")
-            if gpa_strength == "excellent":
-                academic_score += 30
-            elif gpa_strength == "good":
-                academic_score += 20
-            elif gpa_strength == "average":
-                academic_score += 10
+            academic_score += GPA_STRENGTH_POINTS.get(gpa_strength, 0)
         
         # Test scores contribution
         test_analysis = academic_analysis.get("test_score_analysis", {})
         if test_analysis.get("ielts", {}).get("score"):
             ielts_score = test_analysis["ielts"]["score"]
-            if ielts_score >= 7.0:
-                academic_score += 15
-            elif ielts_score >= 6.5:
-                academic_score += 10
-            elif ielts_score >= 6.0:
-                academic_score += 5
+            academic_score += IELTS_POINTS[bisect_right(IELTS_THRESHOLDS, ielts_score)]
         
         # Extracurricular scores
-        extracurricular_score = 0
-        if "activity_diversity" in extracurricular_analysis:
-            extracurricular_score += extracurricular_analysis["activity_diversity"].get("score", 0) * 0.2
-        
-        if "leadership_experience" in extracurricular_analysis:
-            extracurricular_score += extracurricular_analysis["leadership_experience"].get("score", 0) * 0.15
-        
-        if "community_impact" in extracurricular_analysis:
-            extracurricular_score += extracurricular_analysis["community_impact"].get("score", 0) * 0.15
+        extracurricular_score = sum(
+            extracurricular_analysis[section].get("score", 0) * weight
+            for section, weight in EXTRACURRICULAR_WEIGHTS
+            if section in extracurricular_analysis
+        )
         
         # Calculate total score
         total_score = academic_score + extracurricular_score
         
         # Determine overall rating
-        if total_score >= 80:
-            rating = "Outstanding"
-        elif total_score >= 65:
-            rating = "Strong"
-        elif total_score >= 50:
-            rating = "Competitive"
-        elif total_score >= 35:
-            rating = "Developing"
-        else:
-            rating = "Needs Significant Improvement"
+        rating = RATING_LABELS[bisect_right(RATING_THRESHOLDS, total_score)]
         
         return {
             "total_score": round(total_score, 1),
@@ -454,18 +637,7 @@ class ProfileAnalyzerAgent:
     
     def _estimate_percentile(self, score: float) -> str:
         """Ước tính percentile dựa trên điểm số"""
-        if score >= 85:
-            return "Top 5%"
-        elif score >= 75:
-            return "Top 15%"
-        elif score >= 65:
-            return "Top 30%"
-        elif score >= 55:
-            return "Top 50%"
-        elif score >= 45:
-            return "Top 70%"
-        else:
-            return "Below 70%"
+        return PERCENTILE_LABELS[bisect_right(PERCENTILE_THRESHOLDS, score)]
     
     def _create_profile_summary(
         self,
@@ -486,7 +658,7 @@ class ProfileAnalyzerAgent:
         Thành tích học tập: {academic_strength.title()}
         Hoạt động ngoại khóa: {activities_level.title()}
         
-        Điểm mạnh chính: {', '.join(academic_analysis.get('academic_strengths', [])[:3])}
+        Điểm mạnh chính: {', '.join(islice(academic_analysis.get('academic_strengths', ()), 3))}
         Khu vực cần cải thiện: {academic_analysis.get('improvement_priority', 'Chưa xác định')}
         """
         
@@ -3,13 +3,282 @@ Scholarship Finder Agent - Agent tìm kiếm học bổng
 Nhiệm vụ: Tìm kiếm và phân tích các học bổng phù hợp với học sinh
 """
 import asyncio
-import json
+import copy
+import heapq
+import re
 from typing import Dict, List, Any, Optional
+from urllib.parse import urlsplit, parse_qsl, urlencode
 from loguru import logger
 
 from ..utils.llm_client import llm_manager
 from ..config.prompts import SCHOLARSHIP_FINDER_PROMPT, POPULAR_DESTINATIONS
 from ..tools.web_search import web_search_tool
+from ..utils.session_manager import session_manager
+
+def _canonical_url(link: str) -> str:
+    """Normalize a result URL for dedupe: lowercase host without www., no tracking params/fragment/trailing slash"""
+    if not link:
+        return ""
+    
+    parts = urlsplit(link.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode([
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_")
+    ])
+    path = parts.path.rstrip("/")
+    
+    return f"{host}{path}?{query}" if query else f"{host}{path}"
+
+TITLE_WORD_PATTERN = re.compile(r"\w+")
+YEAR_PATTERN = re.compile(r"(?:19|20)\d\d")
+# Words that vary between near-duplicate result titles without changing the subject
+TITLE_NOISE_WORDS = frozenset((
+    "a", "an", "and", "the", "for", "of", "to", "in", "on",
+    "apply", "application", "applications", "now", "open", "opens", "official", "website"
+))
+
+def _title_fingerprint(title: str) -> frozenset:
+    """Word set of a result title without years and noise words (near-duplicate key)"""
+    return frozenset(
+        word for word in TITLE_WORD_PATTERN.findall(title.lower())
+        if word not in TITLE_NOISE_WORDS and not YEAR_PATTERN.fullmatch(word)
+    )
+
+def _keyword_pattern(**groups: tuple) -> "re.Pattern[str]":
+    """Case-insensitive alternation with one named group per keyword category"""
+    return re.compile("|".join(
+        f"(?P<{name}>" + "|".join(map(re.escape, keywords)) + ")"
+        for name, keywords in groups.items()
+    ), re.IGNORECASE)
+
+def _keyword_tags(pattern: "re.Pattern[str]", text: str) -> set:
+    """Keyword categories present in text (single scan)"""
+    return {match.lastgroup for match in pattern.finditer(text)}
+
+# Ranking keywords (case-insensitive, so scanned text needs no lowercased copy)
+VALUE_TIER_PATTERN = _keyword_pattern(
+    full=("full", "100%", "toàn phần"),
+    partial=("partial", "50%", "một phần")
+)
+NAME_KEYWORD_PATTERN = _keyword_pattern(
+    prestigious=("fulbright", "chevening", "gates", "rhodes", "commonwealth"),
+    vietnam=("vietnam", "vietnamese", "việt nam")
+)
+NAME_KEYWORD_POINTS = {"prestigious": 20, "vietnam": 15}
+GPA_REQUIREMENT_PATTERN = _keyword_pattern(
+    moderate=("3.0", "good"),
+    strict=("3.5", "excellent")
+)
+
+# Search summary type counts
+SUMMARY_VALUE_PATTERN = _keyword_pattern(full=("full", "100%"), partial=("partial", "%"))
+SUMMARY_NAME_PATTERN = _keyword_pattern(merit=("merit", "academic"), need=("need", "financial"))
+
+# Snippet trimming: keep the sentences that carry scholarship details
+SNIPPET_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+SNIPPET_KEYWORD_PATTERN = re.compile(
+    r"scholarship|fellowship|bursary|grant|award|deadline|apply|application|eligib|stipend|tuition|"
+    r"học bổng|hạn nộp|[$€£%]",
+    re.IGNORECASE
+)
+SNIPPET_SENTENCE_LIMIT = 3
+
+def _trim_snippet(snippet: str) -> str:
+    """Up to SNIPPET_SENTENCE_LIMIT keyword-bearing sentences; the whole snippet if none match"""
+    relevant = [
+        sentence for sentence in SNIPPET_SENTENCE_SPLIT.split(snippet.strip())
+        if SNIPPET_KEYWORD_PATTERN.search(sentence)
+    ]
+    return " ".join(relevant[:SNIPPET_SENTENCE_LIMIT]) if relevant else snippet
+
+PRIMARY_QUERY_TEMPLATES = (
+    "{country} scholarship {field} {degree} Vietnam students",
+    "{field} scholarship {country} international students 2024",
+    "merit scholarship {country} {field} undergraduate graduate",
+    "{country} university funding {field} Vietnamese students",
+    "full scholarship {country} {field} {degree} 2024 2025"
+)
+
+US_PROGRAM_QUERIES = (
+    "Fulbright scholarship Vietnam",
+    "AAUW fellowship women",
+    "Gates Cambridge scholarship",
+    "Rhodes scholarship"
+)
+UK_PROGRAM_QUERIES = (
+    "Chevening scholarship Vietnam",
+    "Commonwealth scholarship",
+    "Gates Cambridge scholarship"
+)
+# Specific scholarship programs to search, keyed by lowercased country name
+COUNTRY_PROGRAM_QUERIES = {
+    "usa": US_PROGRAM_QUERIES,
+    "united states": US_PROGRAM_QUERIES,
+    "america": US_PROGRAM_QUERIES,
+    "uk": UK_PROGRAM_QUERIES,
+    "united kingdom": UK_PROGRAM_QUERIES,
+    "england": UK_PROGRAM_QUERIES,
+    "canada": (
+        "Vanier scholarship",
+        "Trudeau foundation scholarship",
+        "IDRC scholarship"
+    ),
+    "australia": (
+        "Australia Awards scholarship",
+        "Endeavour scholarship",
+        "University of Melbourne scholarship"
+    )
+}
+
+# Default LLM match score when a scholarship has none
+DEFAULT_MATCH_SCORE = 50
+
+# Well-known graduate programs with stable metadata. Search results whose title
+# names the exact program (KNOWN_SCHOLARSHIP_TITLES) skip LLM extraction, but only
+# for graduate-level students; deadlines and exact amounts change yearly, so those
+# point to the official announcement. Records carry no match score: they rank at
+# DEFAULT_MATCH_SCORE without keyword boosts (no LLM assessed them for the student).
+KNOWN_SCHOLARSHIPS = {
+    "fulbright": {
+        "name": "Fulbright Vietnam Student Program",
+        "organization": "U.S. Department of State - Fulbright Vietnam",
+        "value": "Full scholarship (toàn phần): học phí, sinh hoạt phí, vé máy bay, bảo hiểm y tế",
+        "requirements": {
+            "gpa": "Tốt nghiệp đại học với thành tích học tập tốt",
+            "language": "Tiếng Anh tốt (IELTS/TOEFL theo yêu cầu từng năm)",
+            "other": "Công dân Việt Nam; cam kết về nước sau khi tốt nghiệp"
+        },
+        "deadline": "Theo thông báo hằng năm của Fulbright Vietnam",
+        "description": "Học bổng thạc sĩ toàn phần của Chính phủ Hoa Kỳ dành cho người Việt Nam",
+        "eligibility": "Công dân Việt Nam đã tốt nghiệp đại học, ứng tuyển bậc thạc sĩ tại Hoa Kỳ",
+        "application_process": "Nộp hồ sơ trực tuyến qua Fulbright Vietnam, phỏng vấn, xét tuyển"
+    },
+    "chevening": {
+        "name": "Chevening Scholarship",
+        "organization": "UK Foreign, Commonwealth & Development Office",
+        "value": "Full scholarship (toàn phần): học phí, sinh hoạt phí, vé máy bay khứ hồi",
+        "requirements": {
+            "gpa": "Bằng đại học đủ điều kiện vào thạc sĩ tại Anh",
+            "language": "Đáp ứng yêu cầu tiếng Anh của trường đại học",
+            "other": "Tối thiểu 2 năm kinh nghiệm làm việc; về nước ít nhất 2 năm sau khi học"
+        },
+        "deadline": "Theo thông báo hằng năm trên chevening.org",
+        "description": "Học bổng thạc sĩ một năm toàn phần của Chính phủ Anh cho lãnh đạo tương lai",
+        "eligibility": "Công dân các quốc gia trong chương trình Chevening (bao gồm Việt Nam)",
+        "application_process": "Nộp hồ sơ trực tuyến trên chevening.org, phỏng vấn tại Đại sứ quán Anh"
+    },
+    "gates cambridge": {
+        "name": "Gates Cambridge Scholarship",
+        "organization": "Gates Cambridge Trust",
+        "value": "Full scholarship (toàn phần): toàn bộ chi phí học tập tại University of Cambridge",
+        "requirements": {
+            "gpa": "Thành tích học tập xuất sắc",
+            "language": "Đáp ứng yêu cầu tiếng Anh của University of Cambridge",
+            "other": "Được nhận vào chương trình sau đại học toàn thời gian tại Cambridge"
+        },
+        "deadline": "Theo hạn nộp hồ sơ sau đại học của University of Cambridge",
+        "description": "Học bổng sau đại học toàn phần tại Cambridge cho sinh viên ngoài Vương quốc Anh",
+        "eligibility": "Sinh viên quốc tế (không phải công dân Anh) ứng tuyển thạc sĩ/tiến sĩ tại Cambridge",
+        "application_process": "Nộp đơn vào Cambridge và chọn xét học bổng Gates Cambridge trong đơn"
+    },
+    "australia awards": {
+        "name": "Australia Awards Scholarships",
+        "organization": "Australian Government - Department of Foreign Affairs and Trade",
+        "value": "Full scholarship (toàn phần): học phí, vé máy bay, sinh hoạt phí, bảo hiểm y tế",
+        "requirements": {
+            "gpa": "Bằng đại học đủ điều kiện vào chương trình sau đại học tại Úc",
+            "language": "IELTS/PTE theo yêu cầu của chương trình",
+            "other": "Về nước ít nhất 2 năm sau khi hoàn thành khóa học"
+        },
+        "deadline": "Theo thông báo hằng năm của Australia Awards Vietnam",
+        "description": "Học bổng sau đại học toàn phần của Chính phủ Úc dành cho các nước đối tác",
+        "eligibility": "Công dân Việt Nam đáp ứng tiêu chí của Australia Awards Vietnam",
+        "application_process": "Nộp hồ sơ trực tuyến qua Australia Awards Vietnam, phỏng vấn, xét tuyển"
+    }
+}
+
+# Exact program names only - e.g. "Fulbright University Vietnam" or the
+# Fulbright U.S. Student Program (for US citizens) must not match
+KNOWN_SCHOLARSHIP_TITLES = {
+    "fulbright": re.compile(r"\bfulbright (?:vietnam|foreign) student program\b", re.IGNORECASE),
+    "chevening": re.compile(r"\bchevening scholarships?\b", re.IGNORECASE),
+    "gates cambridge": re.compile(r"\bgates cambridge scholarships?\b", re.IGNORECASE),
+    "australia awards": re.compile(r"\baustralia awards scholarships?\b", re.IGNORECASE)
+}
+# Every registry program is postgraduate; "graduate" is word-bounded so
+# "undergraduate" does not match
+GRADUATE_DEGREE_PATTERN = re.compile(
+    r"\b(?:master'?s?|msc|mba|phd|ph\.d|doctoral|doctorate|postgraduate|graduate)\b"
+    r"|thạc sĩ|tiến sĩ|cao học|sau đại học",
+    re.IGNORECASE
+)
+
+def _known_scholarship_key(result: Dict[str, Any]) -> Optional[str]:
+    """KNOWN_SCHOLARSHIPS key whose exact program name is in a search result's title, if any"""
+    title = result.get("title", "")
+    return next(
+        (key for key, pattern in KNOWN_SCHOLARSHIP_TITLES.items() if pattern.search(title)),
+        None
+    )
+
+# Number of ranked scholarships returned to the user
+RECOMMENDATION_LIMIT = 10
+
+BATCH_ANALYSIS_SCHEMA = {
+    "scholarships": [
+        {
+            "name": "string",
+            "organization": "string",
+            "value": "string",
+            "requirements": {
+                "gpa": "string",
+                "language": "string",
+                "other": "string"
+            },
+            "deadline": "string",
+            "link": "string",
+            "description": "string",
+            "eligibility": "string",
+            "application_process": "string",
+            "match_score": "number 0-100"
+        }
+    ]
+}
+
+# Static prefix shared by every batch request (kept byte-identical so the
+# provider can reuse its prompt cache across batches)
+BATCH_ANALYSIS_SYSTEM_PROMPT = f"""
+{SCHOLARSHIP_FINDER_PROMPT}
+
+{POPULAR_DESTINATIONS}
+
+Phân tích các kết quả tìm kiếm về học bổng và trích xuất thông tin có cấu trúc.
+Tập trung vào học bổng dành cho sinh viên Việt Nam hoặc sinh viên quốc tế.
+"""
+
+DETAIL_EXTRACTION_SCHEMA = {
+    "scholarship_value": "string",
+    "coverage": "string",
+    "eligibility_requirements": {
+        "academic": "string",
+        "language": "string",
+        "nationality": "string",
+        "other": "string"
+    },
+    "application_requirements": ["list of requirements"],
+    "deadline": "string",
+    "application_process": "string",
+    "selection_criteria": "string",
+    "contact_information": "string"
+}
+
+DETAIL_EXTRACTION_SYSTEM_PROMPT = """
+Trích xuất thông tin chi tiết về học bổng từ kết quả tìm kiếm.
+Tập trung vào: giá trị, yêu cầu, hạn nộp, quy trình đăng ký.
+"""
 
 class ScholarshipFinderAgent:
     """Agent tìm kiếm học bổng chuyên nghiệp"""
@@ -18,6 +287,8 @@ class ScholarshipFinderAgent:
         self.name = "ScholarshipFinderAgent"
         self.llm = llm_manager
         self.search_tool = web_search_tool
+        self.cache = session_manager  # Redis-backed when USE_REDIS, local otherwise
+        self.detail_cache_ttl = 24 * 3600
         
     async def find_scholarships(
         self,
@@ -84,74 +355,55 @@ class ScholarshipFinderAgent:
         
         all_results = []
         
-        # Primary search queries
+        # Primary search queries + specific scholarship programs for the country
         search_queries = [
-            f"{country} scholarship {field} {degree} Vietnam students",
-            f"{field} scholarship {country} international students 2024",
-            f"merit scholarship {country} {field} undergraduate graduate",
-            f"{country} university funding {field} Vietnamese students",
-            f"full scholarship {country} {field} {degree} 2024 2025"
+            template.format(country=country, field=field, degree=degree)
+            for template in PRIMARY_QUERY_TEMPLATES
         ]
+        search_queries.extend(COUNTRY_PROGRAM_QUERIES.get(country.lower(), ()))
         
-        # Specific scholarship programs to search
-        if country.lower() in ["usa", "united states", "america"]:
-            search_queries.extend([
-                "Fulbright scholarship Vietnam",
-                "AAUW fellowship women",
-                "Gates Cambridge scholarship",
-                "Rhodes scholarship"
-            ])
-        elif country.lower() in ["uk", "united kingdom", "england"]:
-            search_queries.extend([
-                "Chevening scholarship Vietnam",
-                "Commonwealth scholarship",
-                "Gates Cambridge scholarship"
-            ])
-        elif country.lower() in ["canada"]:
-            search_queries.extend([
-                "Vanier scholarship",
-                "Trudeau foundation scholarship",
-                "IDRC scholarship"
-            ])
-        elif country.lower() in ["australia"]:
-            search_queries.extend([
-                "Australia Awards scholarship",
-                "Endeavour scholarship",
-                "University of Melbourne scholarship"
-            ])
-        
-        # Execute searches
-        for query in search_queries:
-            try:
-                results = await self.search_tool.search_scholarships(
+        # Country-specific programs can repeat a primary query - search each once
+        search_queries = list(dict.fromkeys(search_queries))
+        
+        # Execute searches concurrently (the search tool's semaphore bounds in-flight requests)
+        search_results = await asyncio.gather(
+            *(
+                self.search_tool.search_scholarships(
                     query=query,
                     country=country,
                     field=field,
                     num_results=8
                 )
-                all_results.extend(results)
-                
-                # Add small delay to respect rate limits
-                await asyncio.sleep(0.5)
-                
-            except Exception as e:
-                logger.warning(f"Search failed for query '{query}': {str(e)}")
+                for query in search_queries
+            ),
+            return_exceptions=True
+        )
+        
+        for query, results in zip(search_queries, search_results):
+            if isinstance(results, Exception):
+                logger.warning("Search failed for query '{}': {}", query, results)
                 continue
+            all_results.extend(results)
         
-        # Remove duplicates based on title and link
+        # Remove duplicates based on title and link (titles differing only in
+        # punctuation/year/"apply" noise and mirror/tracking variants of a URL
+        # count as the same). Empty or noise-only titles dedupe by link only.
         unique_results = []
         seen_titles = set()
         seen_links = set()
         
         for result in all_results:
-            title = result.get("title", "").lower()
-            link = result.get("link", "")
+            title = _title_fingerprint(result.get("title", ""))
+            link = _canonical_url(result.get("link", ""))
             
-            if title not in seen_titles and link not in seen_links:
-                unique_results.append(result)
+            if (title and title in seen_titles) or link in seen_links:
+                continue
+            
+            unique_results.append(result)
+            if title:
                 seen_titles.add(title)
-                if link:
-                    seen_links.add(link)
+            if link:
+                seen_links.add(link)
         
         logger.info(f"Found {len(unique_results)} unique scholarship results")
         return unique_results
@@ -164,51 +416,90 @@ class ScholarshipFinderAgent:
         """Phân tích và trích xuất thông tin chi tiết từ kết quả tìm kiếm"""
         
         analyzed_scholarships = []
-        
-        # Process results in batches for efficiency
+        field = student_info.get("field_of_study", "").lower()
+        
+        # Well-known graduate programs come from the registry (once each) instead of
+        # the LLM - only when the student's degree level is graduate; otherwise the
+        # LLM assesses them against the student like any other result
+        use_registry = bool(GRADUATE_DEGREE_PATTERN.search(student_info.get("degree_level", "")))
+        remaining_results = []
+        known_keys = set()
+        for result in search_results:
+            key = _known_scholarship_key(result) if use_registry else None
+            if key is None:
+                remaining_results.append(result)
+            elif key not in known_keys:
+                known_keys.add(key)
+                scholarship = copy.deepcopy(KNOWN_SCHOLARSHIPS[key])
+                scholarship["link"] = result.get("link", "")
+                scholarship["final_match_score"] = DEFAULT_MATCH_SCORE
+                analyzed_scholarships.append(scholarship)
+        
+        # Process results in batches for efficiency; batches are independent LLM
+        # calls, so they run concurrently (capped by the LLM client's semaphore)
         batch_size = 5
-        for i in range(0, len(search_results), batch_size):
-            batch = search_results[i:i+batch_size]
-            
-            try:
-                batch_analysis = await self._analyze_scholarship_batch(batch, student_info)
-                analyzed_scholarships.extend(batch_analysis)
-            except Exception as e:
-                logger.warning(f"Error analyzing batch {i//batch_size + 1}: {str(e)}")
+        batches = [
+            remaining_results[i:i+batch_size]
+            for i in range(0, len(remaining_results), batch_size)
+        ]
+        # Student details are the same for every batch - format them once
+        student_block = self._student_block(student_info)
+        batch_analyses = await asyncio.gather(
+            *(self._analyze_and_score_batch(batch, student_block, field) for batch in batches),
+            return_exceptions=True
+        )
+        
+        for batch_number, batch_analysis in enumerate(batch_analyses, 1):
+            if isinstance(batch_analysis, Exception):
+                logger.warning("Error analyzing batch {}: {}", batch_number, batch_analysis)
                 continue
+            analyzed_scholarships.extend(batch_analysis)
         
         return analyzed_scholarships
     
+    @staticmethod
+    def _student_block(student_info: Dict[str, Any]) -> str:
+        """Phần thông tin học sinh trong prompt phân tích batch"""
+        return (
+            "Thông tin học sinh:\n"
+            f"- Quốc gia: {student_info.get('target_country', '')}\n"
+            f"- Ngành học: {student_info.get('field_of_study', '')}\n"
+            f"- Bậc học: {student_info.get('degree_level', '')}"
+        )
+    
+    async def _analyze_and_score_batch(
+        self,
+        search_batch: List[Dict[str, Any]],
+        student_block: str,
+        field: str
+    ) -> List[Dict[str, Any]]:
+        """Phân tích một batch rồi chấm điểm ngay khi có kết quả (trong lúc các batch khác còn chờ LLM)"""
+        
+        scholarships = await self._analyze_scholarship_batch(search_batch, student_block)
+        
+        for scholarship in scholarships:
+            self._score_scholarship(scholarship, field)
+        
+        return scholarships
+    
     async def _analyze_scholarship_batch(
         self,
         search_batch: List[Dict[str, Any]],
-        student_info: Dict[str, Any]
+        student_block: str
     ) -> List[Dict[str, Any]]:
-        """Phân tích một batch kết quả tìm kiếm"""
+        """Phân tích một batch kết quả tìm kiếm (student_block: xem _student_block)"""
         
         # Prepare search results for LLM analysis
         search_summary = "\n\n".join([
-            f"Title: {result.get('title', '')}\nLink: {result.get('link', '')}\nSnippet: {result.get('snippet', '')}"
+            f"Title: {result.get('title', '')}\nLink: {result.get('link', '')}\nSnippet: {_trim_snippet(result.get('snippet', ''))}"
             for result in search_batch
         ])
         
-        system_prompt = f"""
-        {SCHOLARSHIP_FINDER_PROMPT}
-        
-        {POPULAR_DESTINATIONS}
-        
-        Phân tích các kết quả tìm kiếm về học bổng và trích xuất thông tin có cấu trúc.
-        Tập trung vào học bổng dành cho sinh viên Việt Nam hoặc sinh viên quốc tế.
-        """
-        
         messages = [
             {
                 "role": "user",
                 "content": f"""
-                Thông tin học sinh:
-                - Quốc gia: {student_info.get('target_country', '')}
-                - Ngành học: {student_info.get('field_of_study', '')}
-                - Bậc học: {student_info.get('degree_level', '')}
+                {student_block}
                 
                 Kết quả tìm kiếm:
                 {search_summary}
@@ -220,27 +511,8 @@ class ScholarshipFinderAgent:
         
         response = await self.llm.get_structured_response(
             messages=messages,
-            system_prompt=system_prompt,
-            schema={
-                "scholarships": [
-                    {
-                        "name": "string",
-                        "organization": "string",
-                        "value": "string", 
-                        "requirements": {
-                            "gpa": "string",
-                            "language": "string",
-                            "other": "string"
-                        },
-                        "deadline": "string",
-                        "link": "string",
-                        "description": "string",
-                        "eligibility": "string",
-                        "application_process": "string",
-                        "match_score": "number 0-100"
-                    }
-                ]
-            }
+            system_prompt=BATCH_ANALYSIS_SYSTEM_PROMPT,
+            schema=BATCH_ANALYSIS_SCHEMA
         )
         
         return response.get("scholarships", [])
@@ -252,54 +524,54 @@ class ScholarshipFinderAgent:
     ) -> List[Dict[str, Any]]:
         """Xếp hạng học bổng theo độ phù hợp"""
         
-        # Enhanced ranking based on multiple factors
+        field = student_info.get("field_of_study", "").lower()
+        
+        # Batches from _analyze_scholarship_results arrive already scored
         for scholarship in scholarships:
-            score = scholarship.get("match_score", 50)
-            
-            # Boost score based on scholarship characteristics
-            name = scholarship.get("name", "").lower()
-            value = scholarship.get("value", "").lower()
-            requirements = scholarship.get("requirements", {})
-            
-            # High-value scholarships
-            if any(term in value for term in ["full", "100%", "toàn phần"]):
-                score += 15
-            elif any(term in value for term in ["partial", "50%", "một phần"]):
-                score += 10
-            
-            # Prestigious scholarships
-            prestigious_keywords = ["fulbright", "chevening", "gates", "rhodes", "commonwealth"]
-            if any(keyword in name for keyword in prestigious_keywords):
-                score += 20
-            
-            # Vietnamese-specific scholarships
-            if any(term in name.lower() for term in ["vietnam", "vietnamese", "việt nam"]):
-                score += 15
-            
-            # Field relevance
-            field = student_info.get("field_of_study", "").lower()
-            if field and field in name:
-                score += 10
-            
-            # Reasonable requirements
-            gpa_req = requirements.get("gpa", "").lower()
-            if "3.0" in gpa_req or "good" in gpa_req:
-                score += 5
-            elif "3.5" in gpa_req or "excellent" in gpa_req:
-                score -= 5
-            
-            # Update match score
-            scholarship["final_match_score"] = min(score, 100)
+            if "final_match_score" not in scholarship:
+                self._score_scholarship(scholarship, field)
         
-        # Sort by final match score
-        ranked_scholarships = sorted(
+        # Top 10 scholarships by final match score
+        return heapq.nlargest(
+            RECOMMENDATION_LIMIT,
             scholarships,
-            key=lambda x: x.get("final_match_score", 0),
-            reverse=True
+            key=lambda x: x["final_match_score"]
         )
-        
-        # Return top 10 scholarships
-        return ranked_scholarships[:10]
+    
+    @staticmethod
+    def _score_scholarship(scholarship: Dict[str, Any], field: str):
+        """Tính final_match_score cho một học bổng (field: ngành học đã lowercase)"""
+        
+        score = scholarship.get("match_score", DEFAULT_MATCH_SCORE)
+        
+        # Boost score based on scholarship characteristics
+        name = scholarship.get("name", "").lower()  # lowercased for the field check
+        value = scholarship.get("value", "")
+        requirements = scholarship.get("requirements", {})
+        
+        # High-value scholarships
+        value_tags = _keyword_tags(VALUE_TIER_PATTERN, value)
+        if "full" in value_tags:
+            score += 15
+        elif "partial" in value_tags:
+            score += 10
+        
+        # Prestigious and Vietnamese-specific scholarships
+        score += sum(NAME_KEYWORD_POINTS[tag] for tag in _keyword_tags(NAME_KEYWORD_PATTERN, name))
+        
+        # Field relevance
+        if field and field in name:
+            score += 10
+        
+        # Reasonable requirements
+        gpa_tags = _keyword_tags(GPA_REQUIREMENT_PATTERN, requirements.get("gpa", ""))
+        if "moderate" in gpa_tags:
+            score += 5
+        elif "strict" in gpa_tags:
+            score -= 5
+        
+        # Update match score
+        scholarship["final_match_score"] = min(score, 100)
     
     def _create_search_summary(
         self,
@@ -316,27 +588,27 @@ class ScholarshipFinderAgent:
             "need_based": 0,
             "field_specific": 0
         }
+        total_match_score = 0
         
+        # Single pass: type counts and match score total
         for scholarship in final_scholarships:
-            value = scholarship.get("value", "").lower()
-            name = scholarship.get("name", "").lower()
+            value_tags = _keyword_tags(SUMMARY_VALUE_PATTERN, scholarship.get("value", ""))
+            name_tags = _keyword_tags(SUMMARY_NAME_PATTERN, scholarship.get("name", ""))
             
-            if "full" in value or "100%" in value:
+            if "full" in value_tags:
                 scholarship_types["full_scholarships"] += 1
-            elif "partial" in value or "%" in value:
+            elif "partial" in value_tags:
                 scholarship_types["partial_scholarships"] += 1
             
-            if "merit" in name or "academic" in name:
+            if "merit" in name_tags:
                 scholarship_types["merit_based"] += 1
-            elif "need" in name or "financial" in name:
+            elif "need" in name_tags:
                 scholarship_types["need_based"] += 1
+            
+            total_match_score += scholarship.get("final_match_score", 0)
         
         # Calculate average match score
-        avg_match_score = 0
-        if final_scholarships:
-            avg_match_score = sum(
-                s.get("final_match_score", 0) for s in final_scholarships
-            ) / len(final_scholarships)
+        avg_match_score = total_match_score / len(final_scholarships) if final_scholarships else 0
         
         return {
             "total_searched": len(search_results),
@@ -351,7 +623,13 @@ class ScholarshipFinderAgent:
         scholarship_name: str,
         additional_context: str = ""
     ) -> Dict[str, Any]:
-        """Tìm kiếm thông tin chi tiết về một học bổng cụ thể"""
+        """Tìm kiếm thông tin chi tiết về một học bổng cụ thể (cache theo tên + ngữ cảnh)"""
+        
+        cache_key = self._detail_cache_key(scholarship_name, additional_context)
+        cached = await self.cache.get_cached(cache_key)
+        if cached is not None:
+            logger.info("Using cached scholarship details for: {}", scholarship_name)
+            return cached
         
         try:
             query = f"{scholarship_name} scholarship details requirements application {additional_context}"
@@ -373,12 +651,14 @@ class ScholarshipFinderAgent:
                 scholarship_name, search_results
             )
             
-            return {
+            result = {
                 "success": True,
                 "scholarship_name": scholarship_name,
                 "detailed_info": detailed_info,
                 "sources": [r.get("link", "") for r in search_results]
             }
+            await self.cache.set_cached(cache_key, result, self.detail_cache_ttl)
+            return result
             
         except Exception as e:
             logger.error(f"Error searching specific scholarship: {str(e)}")
@@ -388,6 +668,11 @@ class ScholarshipFinderAgent:
                 "scholarship_name": scholarship_name
             }
     
+    def _detail_cache_key(self, scholarship_name: str, additional_context: str) -> str:
+        """Cache key for specific scholarship lookups"""
+        parts = (scholarship_name, additional_context)
+        return "scholarship:v1:" + "|".join(" ".join(part.lower().split()) for part in parts)
+    
     async def _extract_detailed_scholarship_info(
         self,
         scholarship_name: str,
@@ -400,11 +685,6 @@ class ScholarshipFinderAgent:
             for result in search_results
         ])
         
-        system_prompt = """
-        Trích xuất thông tin chi tiết về học bổng từ kết quả tìm kiếm.
-        Tập trung vào: giá trị, yêu cầu, hạn nộp, quy trình đăng ký.
-        """
-        
         messages = [
             {
                 "role": "user",
@@ -421,22 +701,8 @@ class ScholarshipFinderAgent:
         
         response = await self.llm.get_structured_response(
             messages=messages,
-            system_prompt=system_prompt,
-            schema={
-                "scholarship_value": "string",
-                "coverage": "string",
-                "eligibility_requirements": {
-                    "academic": "string",
-                    "language": "string", 
-                    "nationality": "string",
-                    "other": "string"
-                },
-                "application_requirements": ["list of requirements"],
-                "deadline": "string",
-                "application_process": "string",
-                "selection_criteria": "string",
-                "contact_information": "string"
-            }
+            system_prompt=DETAIL_EXTRACTION_SYSTEM_PROMPT,
+            schema=DETAIL_EXTRACTION_SCHEMA
         )
         
         return response
@@ -29,11 +29,15 @@ class Settings:
     LLM_BASE_URL: str = "https://api.together.xyz/v1"
     MAX_TOKENS: int = 4096
     TEMPERATURE: float = 0.7
+    LLM_CONCURRENCY: int = int(os.getenv("LLM_CONCURRENCY", "8"))  # max in-flight LLM requests
+    LLM_MAX_RETRIES: int = 3  # retries on HTTP 429
+    LLM_RETRY_BASE_DELAY: float = 1.0  # seconds, doubled per retry
     
     # File Upload
     MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", "10"))  # MB
     ALLOWED_EXTENSIONS: List[str] = os.getenv("ALLOWED_EXTENSIONS", "pdf,docx,doc,txt").split(",")
     UPLOAD_DIR: str = "uploads"
+    FILE_PROCESSING_CONCURRENCY: int = int(os.getenv("COORDINATOR_FILE_CONCURRENCY", "4"))
     
     # Session Management
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
@@ -51,6 +55,7 @@ class Settings:
     # Search Settings
     MAX_SEARCH_RESULTS: int = 10
     SEARCH_TIMEOUT: int = 30  # seconds
+    SEARCH_CONCURRENCY: int = int(os.getenv("SEARCH_CONCURRENCY", "8"))  # max in-flight SerpAPI requests
     
     # Email Settings
     EMAIL_TIMEOUT: int = 30  # seconds
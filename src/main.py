@@ -105,8 +105,8 @@ def validate_environment():
     logger.info("Validating environment...")
     
     # Check Python version
-    if sys.version_info < (3, 8):
-        logger.error("Python 3.8+ required")
+    if sys.version_info < (3, 11):
+        logger.error("Python 3.11+ required")
         return False
     
     # Check required directories
@@ -9,6 +9,7 @@ import time
 import json
 
 from ..config.settings import settings
+from ..utils.http_client import get_http_session
 
 class CurrencyConverterTool:
     """Currency converter for scholarship financial calculations"""
@@ -18,6 +19,7 @@ class CurrencyConverterTool:
         self.base_url = f"https://v6.exchangerate-api.com/v6/{self.api_key}"
         self.cache = {}
         self.cache_ttl = 3600  # 1 hour for exchange rates
+        self.timeout = aiohttp.ClientTimeout(total=15, connect=5)
         
     def _get_cache_key(self, from_currency: str, to_currency: str) -> str:
         """Generate cache key for currency pair"""
@@ -57,25 +59,25 @@ class CurrencyConverterTool:
         try:
             url = f"{self.base_url}/pair/{from_currency}/{to_currency}"
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
+            session = await get_http_session()
+            async with session.get(url, timeout=self.timeout) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    
+                    if data.get("result") == "success":
+                        rate = data.get("conversion_rate")
                         
-                        if data.get("result") == "success":
-                            rate = data.get("conversion_rate")
-                            
-                            # Cache the rate
-                            self.cache[cache_key] = (rate, time.time())
-                            
-                            logger.info(f"Exchange rate {from_currency} → {to_currency}: {rate}")
-                            return rate
-                        else:
-                            logger.error(f"Currency API error: {data.get('error-type', 'Unknown')}")
-                            return None
+                        # Cache the rate
+                        self.cache[cache_key] = (rate, time.time())
+                        
+                        logger.info(f"Exchange rate {from_currency} → {to_currency}: {rate}")
+                        return rate
                     else:
-                        logger.error(f"Currency API HTTP error: {response.status}")
+                        logger.error(f"Currency API error: {data.get('error-type', 'Unknown')}")
                         return None
+                else:
+                    logger.error(f"Currency API HTTP error: {response.status}")
+                    return None
                         
         except Exception as e:
             logger.error(f"Error getting exchange rate: {str(e)}")
@@ -103,6 +105,16 @@ class CurrencyConverterTool:
         if rate is None:
             return None
         
+        return self._build_conversion(amount, from_currency, to_currency, rate)
+    
+    def _build_conversion(
+        self,
+        amount: float,
+        from_currency: str,
+        to_currency: str,
+        rate: float
+    ) -> Dict[str, any]:
+        """Conversion result for an amount at a known rate"""
         converted_amount = amount * rate
         
         return {
@@ -134,29 +146,38 @@ class CurrencyConverterTool:
         try:
             url = f"{self.base_url}/latest/{base_currency.upper()}"
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
+            session = await get_http_session()
+            async with session.get(url, timeout=self.timeout) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    
+                    if data.get("result") == "success":
+                        conversion_rates = data.get("conversion_rates", {})
                         
-                        if data.get("result") == "success":
-                            conversion_rates = data.get("conversion_rates", {})
-                            
-                            for currency in target_currencies:
-                                currency_upper = currency.upper()
-                                if currency_upper in conversion_rates:
-                                    rates[currency_upper] = conversion_rates[currency_upper]
-                                    
-                                    # Cache individual rates
-                                    cache_key = self._get_cache_key(base_currency.upper(), currency_upper)
-                                    self.cache[cache_key] = (conversion_rates[currency_upper], time.time())
-                            
-                            logger.info(f"Retrieved {len(rates)} exchange rates for {base_currency}")
-                            return rates
+                        for currency in target_currencies:
+                            currency_upper = currency.upper()
+                            if currency_upper in conversion_rates:
+                                rates[currency_upper] = conversion_rates[currency_upper]
+                                
+                                # Cache individual rates
+                                cache_key = self._get_cache_key(base_currency.upper(), currency_upper)
+                                self.cache[cache_key] = (conversion_rates[currency_upper], time.time())
+                        
+                        logger.info(f"Retrieved {len(rates)} exchange rates for {base_currency}")
+                        return rates
                             
         except Exception as e:
             logger.error(f"Error getting multiple exchange rates: {str(e)}")
         
+        # /latest unavailable - fall back to concurrent per-pair lookups
+        currencies = list(dict.fromkeys(currency.upper() for currency in target_currencies))
+        pair_rates = await asyncio.gather(
+            *(self.get_exchange_rate(base_currency, currency) for currency in currencies)
+        )
+        rates.update(
+            (currency, rate) for currency, rate in zip(currencies, pair_rates) if rate is not None
+        )
+        
         return rates
     
     def get_common_currencies(self) -> Dict[str, str]:
@@ -193,11 +214,23 @@ class CurrencyConverterTool:
         converted_costs = {}
         conversion_details = {}
         
+        # Fetch each distinct rate once, concurrently - categories usually share a currency
+        currencies = list(dict.fromkeys(
+            cost_info.get("currency", "USD").upper() for cost_info in costs.values()
+        ))
+        fetched_rates = await asyncio.gather(
+            *(self.get_exchange_rate(currency, target_currency) for currency in currencies)
+        )
+        rates = dict(zip(currencies, fetched_rates))
+        
         for category, cost_info in costs.items():
             amount = cost_info.get("amount", 0)
             currency = cost_info.get("currency", "USD")
             
-            conversion = await self.convert_amount(amount, currency, target_currency)
+            rate = rates[currency.upper()]
+            conversion = None
+            if rate is not None:
+                conversion = self._build_conversion(amount, currency, target_currency, rate)
             
             if conversion:
                 converted_costs[category] = conversion["converted_amount"]
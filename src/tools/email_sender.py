@@ -70,8 +70,8 @@ class EmailSenderTool:
                 plain_text_content=plain_content
             )
             
-            # Send email
-            response = self.client.send(message)
+            # Send email (SendGrid client is blocking, keep it off the event loop)
+            response = await asyncio.to_thread(self.client.send, message)
             
             if response.status_code in [200, 202]:
                 logger.info(f"Scholarship recommendation email sent to {to_email}")
@@ -263,7 +263,7 @@ Tiềm năng tiết kiệm: {financial_summary.get('potential_scholarship_saving
                 html_content=html_content
             )
             
-            response = self.client.send(message)
+            response = await asyncio.to_thread(self.client.send, message)
             
             if response.status_code in [200, 202]:
                 logger.info(f"Reminder email sent to {to_email}")
@@ -5,8 +5,6 @@ import asyncio
 import os
 import tempfile
 from typing import Dict, List, Optional, Any
-import fitz  # PyMuPDF
-from docx import Document
 from loguru import logger
 import re
 import json
@@ -65,26 +63,13 @@ class FileProcessorTool:
             Extracted content and metadata
         """
         try:
-            doc = fitz.open(file_path)
-            
-            text_content = ""
-            page_contents = []
-            
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                page_text = page.get_text()
-                text_content += page_text + "\n"
-                page_contents.append({
-                    "page": page_num + 1,
-                    "content": page_text.strip()
-                })
-            
-            doc.close()
+            # PyMuPDF parsing is blocking - keep it off the event loop
+            text_content, page_contents = await asyncio.to_thread(self._read_pdf, file_path)
             
             return {
                 "success": True,
                 "content": text_content.strip(),
-                "page_count": len(doc),
+                "page_count": len(page_contents),
                 "pages": page_contents,
                 "file_type": "pdf"
             }
@@ -98,6 +83,30 @@ class FileProcessorTool:
                 "file_type": "pdf"
             }
     
+    @staticmethod
+    def _read_pdf(file_path: str):
+        """Read all pages of a PDF (blocking)"""
+        import fitz  # PyMuPDF - imported on first use, it is slow to load
+        
+        doc = fitz.open(file_path)
+        
+        text_content = ""
+        page_contents = []
+        
+        try:
+            for page_num in range(len(doc)):
+                page = doc.load_page(page_num)
+                page_text = page.get_text()
+                text_content += page_text + "\n"
+                page_contents.append({
+                    "page": page_num + 1,
+                    "content": page_text.strip()
+                })
+        finally:
+            doc.close()
+        
+        return text_content, page_contents
+    
     async def extract_text_from_docx(self, file_path: str) -> Dict[str, Any]:
         """
         Extract text content from DOCX file
@@ -109,16 +118,7 @@ class FileProcessorTool:
             Extracted content and metadata
         """
         try:
-            doc = Document(file_path)
-            
-            text_content = ""
-            paragraphs = []
-            
-            for paragraph in doc.paragraphs:
-                para_text = paragraph.text.strip()
-                if para_text:
-                    text_content += para_text + "\n"
-                    paragraphs.append(para_text)
+            text_content, paragraphs = await asyncio.to_thread(self._read_docx, file_path)
             
             return {
                 "success": True,
@@ -137,6 +137,30 @@ class FileProcessorTool:
                 "file_type": "docx"
             }
     
+    @staticmethod
+    def _read_docx(file_path: str):
+        """Read non-empty paragraphs of a DOCX (blocking)"""
+        from docx import Document  # imported on first use, like PyMuPDF
+        
+        doc = Document(file_path)
+        
+        text_content = ""
+        paragraphs = []
+        
+        for paragraph in doc.paragraphs:
+            para_text = paragraph.text.strip()
+            if para_text:
+                text_content += para_text + "\n"
+                paragraphs.append(para_text)
+        
+        return text_content, paragraphs
+    
+    @staticmethod
+    def _read_txt(file_path: str) -> str:
+        """Read a UTF-8 text file (blocking)"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    
     async def extract_text_from_file(self, file_path: str) -> Dict[str, Any]:
         """
         Extract text from supported file types
@@ -155,8 +179,7 @@ class FileProcessorTool:
             return await self.extract_text_from_docx(file_path)
         elif file_extension == "txt":
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
+                content = await asyncio.to_thread(self._read_txt, file_path)
                 return {
                     "success": True,
                     "content": content,
@@ -307,8 +330,8 @@ class FileProcessorTool:
                 "profile": {}
             }
         
-        # Analyze academic profile
-        profile = self.analyze_academic_profile(extraction_result["content"])
+        # Analyze academic profile (regex scan of the whole document, run in a worker thread)
+        profile = await asyncio.to_thread(self.analyze_academic_profile, extraction_result["content"])
         
         # Add metadata
         profile["document_info"] = {
@@ -8,6 +8,7 @@ from loguru import logger
 import time
 
 from ..config.settings import settings
+from ..utils.http_client import get_http_session
 
 class WebSearchTool:
     """Web search tool for finding scholarship information"""
@@ -18,11 +19,48 @@ class WebSearchTool:
         self.timeout = settings.SEARCH_TIMEOUT
         self.cache = {}
         self.cache_ttl = 1800  # 30 minutes for search results
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Token bucket over settings.MAX_REQUESTS_PER_MINUTE (bursts up to the full budget)
+        self.requests_per_minute = settings.MAX_REQUESTS_PER_MINUTE
+        self._rate_tokens = float(self.requests_per_minute)
+        self._rate_refilled_at = time.monotonic()
+        self._rate_lock: Optional[asyncio.Lock] = None
         
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Cap on in-flight search requests (created lazily inside the event loop)"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.SEARCH_CONCURRENCY)
+        return self._semaphore
+    
+    @property
+    def rate_lock(self) -> asyncio.Lock:
+        """Serializes token bucket updates (created lazily inside the event loop)"""
+        if self._rate_lock is None:
+            self._rate_lock = asyncio.Lock()
+        return self._rate_lock
+    
+    async def _wait_for_rate_limit(self):
+        """Take one request token, waiting for the bucket to refill if it is empty"""
+        async with self.rate_lock:
+            while True:
+                now = time.monotonic()
+                refill = (now - self._rate_refilled_at) * self.requests_per_minute / 60
+                self._rate_tokens = min(self.requests_per_minute, self._rate_tokens + refill)
+                self._rate_refilled_at = now
+                
+                if self._rate_tokens >= 1:
+                    self._rate_tokens -= 1
+                    return
+                
+                await asyncio.sleep((1 - self._rate_tokens) * 60 / self.requests_per_minute)
+    
     def _get_cache_key(self, query: str, **kwargs) -> str:
-        """Generate cache key for search query"""
+        """Generate cache key for search query (case/word-order insensitive)"""
         import hashlib
-        cache_content = f"{query}_{kwargs}"
+        normalized_query = " ".join(sorted(query.lower().split()))
+        cache_content = f"{normalized_query}_{kwargs}"
         return hashlib.md5(cache_content.encode()).hexdigest()
     
     def _is_cache_valid(self, timestamp: float) -> bool:
@@ -66,6 +104,23 @@ class WebSearchTool:
                 logger.info(f"Using cached search results for: {query}")
                 return result
         
+        # Concurrent identical searches share one API request
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_search(cache_key, enhanced_query, num_results))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        
+        # Shield so one cancelled caller does not cancel the shared request
+        return await asyncio.shield(task)
+    
+    async def _fetch_search(
+        self,
+        cache_key: str,
+        enhanced_query: str,
+        num_results: int
+    ) -> List[Dict[str, Any]]:
+        """Call SerpAPI and cache the parsed results"""
         try:
             params = {
                 "q": enhanced_query,
@@ -76,20 +131,25 @@ class WebSearchTool:
                 "gl": "vn",  # Vietnam location
             }
             
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                async with session.get(self.base_url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        results = self._parse_search_results(data)
-                        
-                        # Cache results
-                        self.cache[cache_key] = (results, time.time())
-                        
-                        logger.info(f"Found {len(results)} scholarship search results")
-                        return results
-                    else:
-                        logger.error(f"Search API error: {response.status}")
-                        return []
+            await self._wait_for_rate_limit()
+            session = await get_http_session()
+            async with self.semaphore, session.get(
+                self.base_url,
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    results = self._parse_search_results(data)
+                    
+                    # Cache results
+                    self.cache[cache_key] = (results, time.time())
+                    
+                    logger.info(f"Found {len(results)} scholarship search results")
+                    return results
+                else:
+                    logger.error(f"Search API error: {response.status}")
+                    return []
                         
         except Exception as e:
             logger.error(f"Error searching scholarships: {str(e)}")
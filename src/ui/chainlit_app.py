@@ -3,8 +3,10 @@ Chainlit UI Application for Scholarship Advisor
 Modern, beautiful interface for scholarship consultation
 """
 import chainlit as cl
+from chainlit.server import app as chainlit_server
 import asyncio
 import json
+from contextlib import asynccontextmanager
 from typing import Dict, List, Any, Optional
 from loguru import logger
 from pathlib import Path
@@ -15,6 +17,8 @@ from ..agents.profile_analyzer import profile_analyzer_agent
 from ..agents.financial_calculator import financial_calculator_agent
 from ..agents.advisor import advisor_agent
 from ..config.settings import settings
+from ..utils.http_client import close_http_session
+from ..utils.llm_client import llm_manager
 
 # Global state for multi-step conversation
 class ScholarshipSession:
@@ -170,9 +174,31 @@ async def handle_clarification(user_input: str, session: ScholarshipSession, pro
     else:
         await cl.Message(content="🤔 Tôi vẫn cần thêm thông tin. Bạn có thể chia sẻ thêm không?").send()
 
+LLM_STREAM_LABELS = {
+    "academic_analysis": "🎓 Phân tích thành tích học tập",
+    "extracurricular_analysis": "🏅 Phân tích hoạt động ngoại khóa",
+    "competitiveness_analysis": "⚖️ Đánh giá khả năng cạnh tranh",
+    "profile_recommendations": "🛠️ Gợi ý cải thiện hồ sơ",
+    "cost_analysis": "💰 Phân tích chi phí du học",
+    "financial_recommendations": "💡 Gợi ý tài chính",
+    "advice": "🎯 Tư vấn tổng hợp",
+    "executive_summary": "📋 Tóm tắt tổng quan",
+    "improvement_plan": "📈 Kế hoạch cải thiện hồ sơ"
+}
+
 async def run_full_consultation(session: ScholarshipSession, progress_msg: cl.Message):
     """Run the complete scholarship consultation workflow"""
     
+    llm_steps: Dict[str, cl.Step] = {}
+    
+    async def stream_llm_token(section: str, token: str):
+        step = llm_steps.get(section)
+        if step is None:
+            step = cl.Step(name=LLM_STREAM_LABELS.get(section, section), type="llm")
+            llm_steps[section] = step
+            await step.send()
+        await step.stream_token(token)
+    
     try:
         # Step 2: Find scholarships
         await progress_msg.update(content="🔍 **Bước 2/5**: Đang tìm kiếm học bổng phù hợp...")
@@ -183,28 +209,38 @@ async def run_full_consultation(session: ScholarshipSession, progress_msg: cl.Me
         )
         session.scholarship_results = scholarship_result
         
-        # Step 3: Analyze profile  
-        await progress_msg.update(content="📊 **Bước 3/5**: Đang phân tích hồ sơ của bạn...")
+        # Step 3-4: Profile analysis and cost calculation only depend on the
+        # scholarship search, so they run concurrently
+        await progress_msg.update(content="📊 **Bước 3-4/5**: Đang phân tích hồ sơ và tính toán chi phí...")
         
         file_analysis = None
         if session.uploaded_files:
             file_analysis = {"successful_files": len(session.uploaded_files), "results": []}
         
-        profile_result = await profile_analyzer_agent.analyze_student_profile(
-            student_info=session.student_info,
-            file_analysis=file_analysis,
-            scholarship_requirements=[s.get("requirements", {}) for s in scholarship_result.get("scholarships", [])]
+        scholarships = scholarship_result.get("scholarships", [])
+        profile_result, financial_result = await asyncio.gather(
+            profile_analyzer_agent.analyze_student_profile(
+                student_info=session.student_info,
+                file_analysis=file_analysis,
+                scholarship_requirements=[s.get("requirements", {}) for s in scholarships],
+                stream_callback=stream_llm_token
+            ),
+            financial_calculator_agent.calculate_study_costs(
+                student_info=session.student_info,
+                scholarships=scholarships,
+                target_currency="VND",
+                stream_callback=stream_llm_token
+            ),
+            return_exceptions=True
         )
+        # One failed analysis must not sink the other (or the whole consultation)
+        if isinstance(profile_result, Exception):
+            logger.opt(exception=profile_result).error("Profile analysis failed")
+            profile_result = {"success": False, "error": str(profile_result), "profile_data": {}}
+        if isinstance(financial_result, Exception):
+            logger.opt(exception=financial_result).error("Financial calculation failed")
+            financial_result = {"success": False, "error": str(financial_result), "financial_summary": {}}
         session.profile_results = profile_result
-        
-        # Step 4: Calculate finances
-        await progress_msg.update(content="💰 **Bước 4/5**: Đang tính toán chi phí và tài chính...")
-        
-        financial_result = await financial_calculator_agent.calculate_study_costs(
-            student_info=session.student_info,
-            scholarships=scholarship_result.get("scholarships", []),
-            target_currency="VND"
-        )
         session.financial_results = financial_result
         
         # Step 5: Generate comprehensive advice
@@ -214,10 +250,14 @@ async def run_full_consultation(session: ScholarshipSession, progress_msg: cl.Me
             student_info=session.student_info,
             scholarship_analysis=scholarship_result,
             profile_analysis=profile_result,
-            financial_analysis=financial_result
+            financial_analysis=financial_result,
+            stream_callback=stream_llm_token
         )
         session.final_advice = advice_result
         
+        for step in llm_steps.values():
+            await step.update()
+        
         # Display results
         await display_consultation_results(session, progress_msg)
         
@@ -414,6 +454,20 @@ async def set_custom_styling():
     
     await cl.Message(content=custom_css).send()
 
+# Chainlit 1.1 has no app-shutdown hook, so wrap its server lifespan to close the
+# pooled HTTP/LLM clients on the running loop when the server stops
+_chainlit_lifespan = chainlit_server.router.lifespan_context
+
+@asynccontextmanager
+async def _lifespan(app):
+    async with _chainlit_lifespan(app) as state:
+        yield state
+    await close_http_session()
+    await llm_manager.close()
+    logger.info("Closed shared HTTP and LLM clients")
+
+chainlit_server.router.lifespan_context = _lifespan
+
 if __name__ == "__main__":
     cl.run(
         host="0.0.0.0",
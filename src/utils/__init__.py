@@ -4,8 +4,14 @@ Utility functions and helpers
 
 from .llm_client import llm_manager
 from .session_manager import session_manager
+from .http_client import get_http_session, close_http_session
+from .json_utils import dumps_json, loads_json
 
 __all__ = [
     "llm_manager",
-    "session_manager"
+    "session_manager",
+    "get_http_session",
+    "close_http_session",
+    "dumps_json",
+    "loads_json"
 ]
\ No newline at end of file
@@ -0,0 +1,33 @@
+"""
+Shared aiohttp session for outbound HTTP calls (SerpAPI, ExchangeRate-API, ...)
+Reusing one pooled session avoids a TCP/TLS handshake on every request
+"""
+from typing import Optional
+import aiohttp
+from loguru import logger
+
+_session: Optional[aiohttp.ClientSession] = None
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Get (lazily create) the shared pooled client session"""
+    global _session
+
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=100,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            )
+        )
+        logger.info("Created shared HTTP session")
+
+    return _session
+
+async def close_http_session():
+    """Close the shared client session"""
+    global _session
+
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -0,0 +1,29 @@
+"""
+Fast JSON helpers - orjson when available, stdlib json otherwise
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+
+    def dumps_json(obj: Any, sort_keys: bool = False) -> str:
+        """Serialize to a UTF-8 JSON string (non-ASCII kept as-is)"""
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=str, option=option).decode()
+
+    def loads_json(data: str) -> Any:
+        """Parse JSON text; raises json.JSONDecodeError on invalid input"""
+        return orjson.loads(data)
+
+except ImportError:  # pragma: no cover - orjson is optional
+
+    def dumps_json(obj: Any, sort_keys: bool = False) -> str:
+        """Serialize to a UTF-8 JSON string (non-ASCII kept as-is)"""
+        return json.dumps(obj, ensure_ascii=False, default=str, sort_keys=sort_keys)
+
+    def loads_json(data: str) -> Any:
+        """Parse JSON text; raises json.JSONDecodeError on invalid input"""
+        return json.loads(data)
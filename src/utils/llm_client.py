@@ -2,42 +2,107 @@
 Together AI LLM Client for Scholarship Advisor - Qwen2.5-72B-Instruct-Turbo
 """
 import asyncio
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Awaitable, Tuple
+import httpx
 import openai
 from loguru import logger
 import time
 import json
+import random
 import re
 
 from ..config.settings import settings
+from .json_utils import loads_json
+
+# Fully rendered structured-output system prompts, keyed by (system prompt, schema
+# identity). Agents pass module-level prompt and schema constants, so each pair is
+# rendered once per process and every request sends a byte-identical prefix, which
+# keeps it eligible for provider-side prompt caching.
+# The schema object is kept in the entry so its id cannot be reused while cached.
+SCHEMA_CACHE_SIZE = 64
+_structured_prompt_cache: Dict[Tuple[str, int], Tuple[Dict[str, Any], str]] = {}
+
+STRUCTURED_PROMPT_TEMPLATE = """{system_prompt}
+
+QUAN TRỌNG: Trả lời CHÍNH XÁC theo định dạng JSON sau đây. Không thêm text giải thích bên ngoài JSON.
+
+Schema JSON:
+{schema_str}
+
+Hãy trả lời bằng JSON hợp lệ theo schema trên."""
+
+# Extra completion parameters callers may pass through **kwargs
+ALLOWED_COMPLETION_PARAMS = ('stream', 'top_p', 'frequency_penalty', 'presence_penalty', 'stop')
+
+class DefaultResponse(dict):
+    """Placeholder structure returned when an LLM call or JSON parsing fails"""
+
+def _clean_completion_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the extra completion parameters the API accepts"""
+    return {key: value for key, value in kwargs.items() if key in ALLOWED_COMPLETION_PARAMS}
+
+def _structured_system_prompt(system_prompt: str, schema: Dict[str, Any]) -> str:
+    """System prompt + JSON schema instructions, memoized per (prompt, schema object)"""
+    cache_key = (system_prompt, id(schema))
+    entry = _structured_prompt_cache.get(cache_key)
+    if entry is not None and entry[0] is schema:
+        return entry[1]
+    
+    prompt = STRUCTURED_PROMPT_TEMPLATE.format(
+        system_prompt=system_prompt,
+        schema_str=json.dumps(schema, indent=2, ensure_ascii=False)
+    )
+    if len(_structured_prompt_cache) >= SCHEMA_CACHE_SIZE:
+        _structured_prompt_cache.clear()
+    _structured_prompt_cache[cache_key] = (schema, prompt)
+    return prompt
 
 class TogetherAIClient:
     """Client for Together AI API - Optimized for Qwen Turbo"""
     
     def __init__(self):
-        # Initialize client with proper error handling
-        try:
-            self.client = openai.AsyncOpenAI(
-                api_key=settings.TOGETHER_API_KEY,
-                base_url=settings.LLM_BASE_URL,
-            )
-        except TypeError as e:
-            if "proxies" in str(e).lower():
-                # Fallback for version conflicts
-                import httpx
-                self.client = openai.AsyncOpenAI(
-                    api_key=settings.TOGETHER_API_KEY,
-                    base_url=settings.LLM_BASE_URL,
-                    http_client=httpx.AsyncClient()
-                )
-                logger.info("Using httpx client fallback for compatibility")
-            else:
-                raise
+        # One pooled HTTP client for every LLM call (keep-alive connections are reused
+        # across agents). Passing it explicitly also sidesteps the openai/httpx
+        # "proxies" argument incompatibility.
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=100),
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            follow_redirects=True
+        )
+        self.client = openai.AsyncOpenAI(
+            api_key=settings.TOGETHER_API_KEY,
+            base_url=settings.LLM_BASE_URL,
+            http_client=self.http_client
+        )
         
         self.model = settings.LLM_MODEL
         self.last_request_time = 0
         self.min_request_interval = 0.5  # Reduced for Turbo model
+        self._semaphore: Optional[asyncio.Semaphore] = None
         
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Global cap on in-flight LLM requests (created lazily inside the event loop)"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.LLM_CONCURRENCY)
+        return self._semaphore
+    
+    async def close(self):
+        """Close the pooled HTTP client"""
+        await self.client.close()
+    
+    async def _create_completion(self, **api_params):
+        """Call the completions API, retrying with exponential backoff on HTTP 429"""
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            try:
+                return await self.client.chat.completions.create(**api_params)
+            except openai.RateLimitError:
+                if attempt == settings.LLM_MAX_RETRIES:
+                    raise
+                delay = settings.LLM_RETRY_BASE_DELAY * (2 ** attempt) + random.uniform(0, 0.5)
+                logger.warning(f"Rate limited by Together AI, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+    
     async def _rate_limit(self):
         """Rate limiting for API calls"""
         current_time = time.time()
@@ -83,11 +148,7 @@ class TogetherAIClient:
             formatted_messages.extend(messages)
             
             # Clean kwargs to avoid unexpected parameters
-            clean_kwargs = {}
-            allowed_params = ['stream', 'top_p', 'frequency_penalty', 'presence_penalty', 'stop']
-            for key, value in kwargs.items():
-                if key in allowed_params:
-                    clean_kwargs[key] = value
+            clean_kwargs = _clean_completion_kwargs(kwargs)
             
             # Optimize parameters for Qwen Turbo
             api_params = {
@@ -100,7 +161,8 @@ class TogetherAIClient:
             
             # Make API call with enhanced error handling
             try:
-                response = await self.client.chat.completions.create(**api_params)
+                async with self.semaphore:
+                    response = await self._create_completion(**api_params)
                 
                 if response.choices and len(response.choices) > 0:
                     result = response.choices[0].message.content
@@ -136,6 +198,59 @@ class TogetherAIClient:
             logger.error(f"Error generating LLM response: {str(e)}")
             return "Đã xảy ra lỗi không mong muốn. Vui lòng thử lại."
     
+    async def generate_response_stream(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Stream response tokens from Together AI (OpenAI-compatible stream=True)
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            system_prompt: Optional system prompt
+            temperature: Optional temperature override
+            max_tokens: Optional max tokens override
+            
+        Yields:
+            Text deltas as they arrive
+        """
+        await self._rate_limit()
+        
+        formatted_messages = []
+        if system_prompt:
+            formatted_messages.append({
+                "role": "system",
+                "content": system_prompt
+            })
+        formatted_messages.extend(messages)
+        
+        # Same extra parameters as generate_response; streaming is always on here
+        clean_kwargs = _clean_completion_kwargs(kwargs)
+        clean_kwargs["stream"] = True
+        
+        async with self.semaphore:
+            stream = await self._create_completion(
+                model=self.model,
+                messages=formatted_messages,
+                temperature=temperature or settings.TEMPERATURE,
+                max_tokens=max_tokens or settings.MAX_TOKENS,
+                **clean_kwargs
+            )
+            
+            async for chunk in stream:
+                if chunk.choices:
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+    
+    def _build_structured_prompt(self, system_prompt: str, schema: Dict[str, Any]) -> str:
+        """Append JSON schema instructions to a system prompt"""
+        return _structured_system_prompt(system_prompt, schema)
+    
     async def generate_structured_response(
         self,
         messages: List[Dict[str, str]],
@@ -156,20 +271,12 @@ class TogetherAIClient:
         """
         try:
             # Enhanced schema prompt for better JSON output
-            schema_str = json.dumps(schema, indent=2, ensure_ascii=False)
-            enhanced_prompt = f"""{system_prompt}
-
-QUAN TRỌNG: Trả lời CHÍNH XÁC theo định dạng JSON sau đây. Không thêm text giải thích bên ngoài JSON.
-
-Schema JSON:
-{schema_str}
-
-Hãy trả lời bằng JSON hợp lệ theo schema trên."""
+            enhanced_prompt = self._build_structured_prompt(system_prompt, schema)
             
+            kwargs.setdefault("temperature", 0.1)  # Lower temperature for structured output
             response = await self.generate_response(
                 messages=messages,
                 system_prompt=enhanced_prompt,
-                temperature=0.1,  # Lower temperature for structured output
                 **kwargs
             )
             
@@ -186,12 +293,62 @@ Hãy trả lời bằng JSON hợp lệ theo schema trên."""
             logger.error(f"Error generating structured response: {str(e)}")
             return self._create_default_response(schema)
     
+    async def generate_structured_response_stream(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: str,
+        schema: Dict[str, Any],
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Stream a structured response, forwarding tokens as they arrive
+        
+        Args:
+            messages: Conversation messages
+            system_prompt: System prompt with schema instructions
+            schema: Expected response schema
+            on_token: Optional async callback receiving each text delta
+            **kwargs: temperature/max_tokens overrides and extra completion parameters
+            
+        Returns:
+            Parsed structured response (parsed once the stream completes)
+        """
+        try:
+            enhanced_prompt = self._build_structured_prompt(system_prompt, schema)
+            
+            kwargs.setdefault("temperature", 0.1)  # Lower temperature for structured output
+            chunks = []
+            async for token in self.generate_response_stream(
+                messages=messages,
+                system_prompt=enhanced_prompt,
+                **kwargs
+            ):
+                chunks.append(token)
+                if on_token:
+                    await on_token(token)
+            
+            response = "".join(chunks)
+            logger.info(f"LLM stream completed: {len(response)} characters")
+            
+            parsed_json = self._extract_and_parse_json(response, schema)
+            
+            if parsed_json:
+                return parsed_json
+            else:
+                logger.warning("Could not parse streamed JSON, returning default structure")
+                return self._create_default_response(schema)
+                
+        except Exception as e:
+            logger.error(f"Error streaming structured response: {str(e)}")
+            return self._create_default_response(schema)
+    
     def _extract_and_parse_json(self, response: str, schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Enhanced JSON extraction with multiple fallback methods"""
         
         # Method 1: Direct JSON parsing
         try:
-            return json.loads(response.strip())
+            return loads_json(response.strip())
         except json.JSONDecodeError:
             pass
         
@@ -200,7 +357,7 @@ Hãy trả lời bằng JSON hợp lệ theo schema trên."""
         match = re.search(json_pattern, response, re.DOTALL | re.IGNORECASE)
         if match:
             try:
-                return json.loads(match.group(1))
+                return loads_json(match.group(1))
             except json.JSONDecodeError:
                 pass
         
@@ -210,7 +367,7 @@ Hãy trả lời bằng JSON hợp lệ theo schema trên."""
         
         for match in matches:
             try:
-                parsed = json.loads(match)
+                parsed = loads_json(match)
                 # Validate that it matches schema structure
                 if self._validate_json_structure(parsed, schema):
                     return parsed
@@ -258,7 +415,7 @@ Hãy trả lời bằng JSON hợp lệ theo schema trên."""
                         value = match.group(1)
                         # Try to parse as number or list
                         if value.startswith('['):
-                            result[key] = json.loads(value)
+                            result[key] = loads_json(value)
                         elif value.replace('.', '').isdigit():
                             result[key] = float(value) if '.' in value else int(value)
                         else:
@@ -290,7 +447,7 @@ Hãy trả lời bằng JSON hợp lệ theo schema trên."""
             else:
                 default_response[key] = None
         
-        return default_response
+        return DefaultResponse(default_response)
 
 class LLMManager:
     """Manager for LLM operations with caching and error handling"""
@@ -342,20 +499,68 @@ class LLMManager:
         
         return response
     
+    @staticmethod
+    def is_default_response(response: Dict[str, Any]) -> bool:
+        """True when a structured response is the failure placeholder, not an LLM answer"""
+        return isinstance(response, DefaultResponse)
+    
+    async def close(self):
+        """Release pooled LLM connections (call on app shutdown)"""
+        await self.client.close()
+    
     async def get_structured_response(
         self,
         messages: List[Dict[str, str]], 
         system_prompt: str,
         schema: Dict[str, Any],
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
         **kwargs
     ) -> Dict[str, Any]:
-        """Get structured response from LLM"""
+        """Get structured response from LLM (streamed to on_token when given)"""
+        if on_token:
+            return await self.get_structured_response_stream(
+                messages=messages,
+                system_prompt=system_prompt,
+                schema=schema,
+                on_token=on_token,
+                **kwargs
+            )
         return await self.client.generate_structured_response(
             messages=messages,
             system_prompt=system_prompt,
             schema=schema,
             **kwargs
         )
+    
+    async def get_structured_response_stream(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: str,
+        schema: Dict[str, Any],
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """Get structured response from LLM, streaming tokens to on_token"""
+        return await self.client.generate_structured_response_stream(
+            messages=messages,
+            system_prompt=system_prompt,
+            schema=schema,
+            on_token=on_token,
+            **kwargs
+        )
+
+def bind_stream_section(
+    stream_callback: Optional[Callable[[str, str], Awaitable[None]]],
+    section: str
+) -> Optional[Callable[[str], Awaitable[None]]]:
+    """Bind a section name to a UI stream callback taking (section, token)"""
+    if stream_callback is None:
+        return None
+    
+    async def on_token(token: str):
+        await stream_callback(section, token)
+    
+    return on_token
 
 # Global LLM manager instance
 llm_manager = LLMManager()
\ No newline at end of file
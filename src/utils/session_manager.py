@@ -3,14 +3,19 @@ Session Manager for Scholarship Advisor
 Handles user sessions, state management, and data persistence
 """
 import asyncio
+import copy
 import json
 import time
+from collections import OrderedDict
 from typing import Dict, Any, Optional, List
 from loguru import logger
 import redis.asyncio as redis
 
 from ..config.settings import settings
 
+# Số giá trị cache được giữ lại (LRU) khi không dùng Redis
+LOCAL_CACHE_SIZE = 512
+
 class SessionManager:
     """Manages user sessions and conversation state"""
     
@@ -19,6 +24,8 @@ class SessionManager:
         self.session_timeout = settings.SESSION_TIMEOUT
         self.redis_client = None
         self.local_sessions = {}  # Fallback for local storage
+        # key -> (value, expires_at), LRU fallback for Redis cache
+        self.local_cache: "OrderedDict[str, tuple]" = OrderedDict()
         
     async def initialize(self):
         """Initialize session storage"""
@@ -181,8 +188,45 @@ class SessionManager:
             return agent_data.get("result") if agent_data else None
         return None
     
+    async def get_cached(self, key: str) -> Optional[Any]:
+        """Get a cached value (shared across processes when Redis is enabled)"""
+        try:
+            if self.use_redis and self.redis_client:
+                data = await self.redis_client.get(key)
+                return json.loads(data) if data else None
+            
+            entry = self.local_cache.get(key)
+            if entry:
+                value, expires_at = entry
+                if time.time() < expires_at:
+                    self.local_cache.move_to_end(key)
+                    # Copy like a Redis round-trip, so callers can't mutate the cached value
+                    return copy.deepcopy(value)
+                self.local_cache.pop(key, None)
+        except Exception as e:
+            logger.warning(f"Error reading cache key {key}: {str(e)}")
+        
+        return None
+    
+    async def set_cached(self, key: str, value: Any, ttl: int):
+        """Cache a JSON-serializable value for ttl seconds"""
+        try:
+            if self.use_redis and self.redis_client:
+                await self.redis_client.setex(
+                    key,
+                    ttl,
+                    json.dumps(value, ensure_ascii=False, default=str)
+                )
+            else:
+                self.local_cache[key] = (copy.deepcopy(value), time.time() + ttl)
+                self.local_cache.move_to_end(key)
+                if len(self.local_cache) > LOCAL_CACHE_SIZE:
+                    self.local_cache.popitem(last=False)
+        except Exception as e:
+            logger.warning(f"Error writing cache key {key}: {str(e)}")
+    
     async def cleanup_expired_sessions(self):
-        """Clean up expired sessions (for local storage)"""
+        """Clean up expired sessions and cache entries (for local storage)"""
         if not self.use_redis:
             current_time = time.time()
             expired_sessions = []
@@ -194,6 +238,13 @@ class SessionManager:
             for session_id in expired_sessions:
                 self.local_sessions.pop(session_id, None)
                 logger.info(f"Cleaned up expired session: {session_id}")
+            
+            expired_keys = [
+                key for key, (_, expires_at) in self.local_cache.items()
+                if expires_at <= current_time
+            ]
+            for key in expired_keys:
+                self.local_cache.pop(key, None)
     
     async def get_session_stats(self) -> Dict[str, Any]:
         """Get session statistics"""